@@ -1,18 +1,40 @@
+import atexit
 import os
 import logging
+import queue
 import sys
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
 import certifi
 from dotenv import load_dotenv
 
-# --- 1. 全局初始化 (Global Initialization) ---
-# 加载 .env 文件
-load_dotenv()
-
-# 强制设置 SSL 证书路径 (解决 Windows 下的 SSL 报错)
-os.environ['SSL_CERT_FILE'] = certifi.where()
-os.environ['REQUESTS_CA_BUNDLE'] = certifi.where()
+__all__ = [
+    "SERVICE_HOST",
+    "SERVICE_PORT",
+    "CLOUD_RUN_URL",
+    "LOCAL_URL",
+    "SERVICE_URL",
+    "AGENT_CARD_PATH",
+    "AGENT_CARD_FULL_URL",
+    "DEFAULT_MODEL_NAME",
+    "LOG_LEVEL",
+    "LOG_LEVEL_STR",
+    "LOG_FORMAT",
+    "LOG_FILE",
+    "SEMANTIC_CACHE_ENABLED",
+    "MAX_CONCURRENT_QUERIES",
+    "Settings",
+    "get_settings",
+    "env_flag",
+    "cleanup_logs",
+    "setup_logging",
+    "get_api_key",
+]
 
-# --- 2. 配置常量 (Constants) ---
+# --- 1. 配置常量 (Constants) ---
 # 服务端配置
 SERVICE_HOST = "0.0.0.0"
 SERVICE_PORT = 8001
@@ -24,22 +46,95 @@ SERVICE_PORT = 8001
 CLOUD_RUN_URL = "https://mygoogleagent-781259129090.us-central1.run.app"
 LOCAL_URL = f"http://localhost:{SERVICE_PORT}"
 
-SERVICE_URL = os.environ.get("REMOTE_CATALOG_URL", CLOUD_RUN_URL)
-
 AGENT_CARD_PATH = "/.well-known/agent-card.json"
-AGENT_CARD_FULL_URL = f"{SERVICE_URL}{AGENT_CARD_PATH}"
 
 # 模型配置
 # 建议统一管理模型名称，方便切换
 DEFAULT_MODEL_NAME = "gemini-2.0-flash-lite-preview-02-05"
 
-# 日志配置
-# 允许通过环境变量覆盖，方便调试 (例如: set LOG_LEVEL=DEBUG)
-LOG_LEVEL_STR = os.environ.get("LOG_LEVEL", "INFO").upper()
-LOG_LEVEL = getattr(logging, LOG_LEVEL_STR, logging.INFO)
 LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s:%(lineno)d: %(message)s"
 LOG_FILE = "logger.log"
 
+# 标记由 setup_logging 挂载的 handler，用于幂等判断
+_CONSOLE_SENTINEL = "_mygoogleagent_console"
+_FILE_SENTINEL = "_mygoogleagent_file"
+
+# 后台日志线程 (由 setup_logging 创建并在进程退出时停止)
+_queue_listener: Optional[QueueListener] = None
+# 监听线程是否在运行：由 setup_logging / _stop_listener / fork 钩子维护，不读取 QueueListener 的私有属性
+_listener_running = False
+
+
+# --- 2. 运行时配置 (Runtime Settings) ---
+@dataclass(frozen=True)
+class Settings:
+    """
+    进程级配置快照。
+    由 get_settings() 创建一次并缓存，避免在热路径上反复读取环境变量。
+    """
+    service_url: str
+    log_level: int
+    default_model_name: str = DEFAULT_MODEL_NAME
+    # 语义响应缓存 (memory_demo_agent)，默认关闭以保持演示行为不变
+    semantic_cache_enabled: bool = False
+    # run_session(concurrent=True) 的最大并发查询数
+    max_concurrent_queries: int = 4
+
+    @property
+    def agent_card_full_url(self) -> str:
+        return f"{self.service_url}{AGENT_CARD_PATH}"
+
+    @cached_property
+    def api_key(self) -> str:
+        """获取并验证 API Key (成功后缓存，缺失时每次都会重新检查)"""
+        key = os.environ.get("GOOGLE_API_KEY")
+        if not key:
+            raise ValueError("❌ GOOGLE_API_KEY is missing. Please check your .env file.")
+        return key
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """读取布尔型环境变量 (1/true/yes/on 视为开启)"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    全局初始化 (Global Initialization)，每个进程只执行一次。
+    """
+    # 加载 .env 文件
+    load_dotenv()
+
+    # 设置 SSL 证书路径 (解决 Windows 下的 SSL 报错)
+    # 已通过环境变量指定时 (例如 Dockerfile) 直接复用，不再调用 certifi.where()
+    ca_bundle = os.environ.get('SSL_CERT_FILE') or certifi.where()
+    os.environ.setdefault('SSL_CERT_FILE', ca_bundle)
+    os.environ.setdefault('REQUESTS_CA_BUNDLE', ca_bundle)
+
+    # 日志级别允许通过环境变量覆盖，方便调试 (例如: set LOG_LEVEL=DEBUG)
+    log_level_str = os.environ.get("LOG_LEVEL", "INFO").upper()
+    return Settings(
+        service_url=os.environ.get("REMOTE_CATALOG_URL", CLOUD_RUN_URL),
+        log_level=getattr(logging, log_level_str, logging.INFO),
+        semantic_cache_enabled=env_flag("SEMANTIC_CACHE_ENABLED"),
+        max_concurrent_queries=max(1, int(os.environ.get("MAX_CONCURRENT_QUERIES", "4"))),
+    )
+
+
+_settings = get_settings()
+
+# 兼容旧的模块级常量 (from config import settings; settings.SERVICE_URL)
+SERVICE_URL = _settings.service_url
+AGENT_CARD_FULL_URL = _settings.agent_card_full_url
+LOG_LEVEL = _settings.log_level
+LOG_LEVEL_STR = logging.getLevelName(LOG_LEVEL)
+SEMANTIC_CACHE_ENABLED = _settings.semantic_cache_enabled
+MAX_CONCURRENT_QUERIES = _settings.max_concurrent_queries
+
 def cleanup_logs(log_files: list[str] = None) -> None:
     """
     清理旧的日志文件 (对应教程 1.3 节)。
@@ -56,7 +151,12 @@ def cleanup_logs(log_files: list[str] = None) -> None:
             except OSError as e:
                 print(f"⚠️ Failed to clean up {log_file}: {e}")
 
-def setup_logging(logger_name: str = "root", log_to_file: bool = True) -> logging.Logger:
+def setup_logging(
+    logger_name: str = "root",
+    log_to_file: bool = True,
+    root_level: Optional[int] = None,
+    lib_levels: Optional[dict[str, int]] = None,
+) -> logging.Logger:
     """
     统一的日志配置函数 (Production Ready)。
     
@@ -64,35 +164,106 @@ def setup_logging(logger_name: str = "root", log_to_file: bool = True) -> loggin
     1. 配置 Root Logger，捕获所有库的日志 (包括 google.adk)。
     2. 同时输出到 Console (方便开发) 和 File (方便追溯)。
     3. 避免重复添加 Handler。
+    4. Root Logger 上只挂一个 QueueHandler，格式化与文件 I/O 由后台 QueueListener 线程完成，
+       不会阻塞运行 LLM / A2A 请求的事件循环。
+
+    Args:
+        logger_name: 返回的 logger 名称。
+        log_to_file: 是否同时写入 LOG_FILE。
+        root_level: Root Logger 级别，默认使用 LOG_LEVEL。
+        lib_levels: 额外的 {logger 名称: 级别}，例如 {"google.adk": logging.DEBUG}。
     """
+    global _queue_listener, _listener_running
+
+    # LOG_FORMAT 不包含线程/进程字段，关闭这些采集以减少每条日志记录的开销
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
     root_logger = logging.getLogger()
-    root_logger.setLevel(LOG_LEVEL)
-    
-    # 如果已经配置过，直接返回 logger，避免重复添加 handler 导致日志重复
-    if root_logger.hasHandlers():
+    root_logger.setLevel(LOG_LEVEL if root_level is None else root_level)
+    for name, level in (lib_levels or {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    # 通过哨兵属性识别我们自己创建的 handler，而不是依赖 hasHandlers()：
+    # 第三方库 (google.adk 等) 先挂了 handler 时我们的 handler 依然会被添加，
+    # 而重复调用时也不会叠加 handler 导致日志重复输出。
+    handlers = list(_queue_listener.handlers) if _queue_listener else []
+    has_console = any(getattr(h, _CONSOLE_SENTINEL, False) for h in handlers)
+    has_file = any(getattr(h, _FILE_SENTINEL, False) for h in handlers)
+    if has_console and (has_file or not log_to_file):
         return logging.getLogger(logger_name)
 
     formatter = logging.Formatter(LOG_FORMAT, datefmt="%Y-%m-%d %H:%M:%S")
 
     # 1. Console Handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+    if not has_console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(formatter)
+        setattr(console_handler, _CONSOLE_SENTINEL, True)
+        handlers.append(console_handler)
 
     # 2. File Handler
-    if log_to_file:
+    if log_to_file and not has_file:
         try:
-            file_handler = logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8')
+            # delay=True: 第一次真正写日志时才打开文件
+            file_handler = logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8', delay=True)
             file_handler.setFormatter(formatter)
-            root_logger.addHandler(file_handler)
+            setattr(file_handler, _FILE_SENTINEL, True)
+            handlers.append(file_handler)
         except Exception as e:
             print(f"⚠️ Failed to setup file logging: {e}")
 
+    # 3. Queue Handler / Listener
+    if _queue_listener is None:
+        log_queue = queue.SimpleQueue()
+        root_logger.addHandler(QueueHandler(log_queue))
+        _queue_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        atexit.register(_stop_listener)
+    else:
+        # 后续调用补充了新的 handler (例如首次未开启文件日志)，重启监听线程
+        _stop_listener()
+        _queue_listener.handlers = tuple(handlers)
+    _queue_listener.start()
+    _listener_running = True
+
     return logging.getLogger(logger_name)
 
+# fork 前是否停止了 QueueListener (由 fork 钩子在父子进程中重新启动)
+_listener_paused = False
+
+def _stop_listener() -> None:
+    """停止监听线程 (处理完队列中已有的日志)；未运行时什么也不做。"""
+    global _listener_running
+    if _listener_running:
+        _queue_listener.stop()
+        _listener_running = False
+
+def _pause_listener_before_fork() -> None:
+    """
+    fork 出的子进程只继承队列，不继承 QueueListener 线程 (例如 gunicorn --preload 的 worker)。
+    fork 前先停止监听线程：stop() 会处理完队列中已有的日志，避免这些记录被复制到子进程中重复输出。
+    """
+    global _listener_paused
+    if _listener_running:
+        _stop_listener()
+        _listener_paused = True
+
+def _resume_listener_after_fork() -> None:
+    """父进程与子进程各自重新启动监听线程，否则子进程的日志会一直滞留在队列里。"""
+    global _listener_paused, _listener_running
+    if _listener_paused:
+        _listener_paused = False
+        _queue_listener.start()
+        _listener_running = True
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_pause_listener_before_fork,
+        after_in_parent=_resume_listener_after_fork,
+        after_in_child=_resume_listener_after_fork,
+    )
+
 def get_api_key() -> str:
     """获取并验证 API Key"""
-    key = os.environ.get("GOOGLE_API_KEY")
-    if not key:
-        raise ValueError("❌ GOOGLE_API_KEY is missing. Please check your .env file.")
-    return key
+    return get_settings().api_key
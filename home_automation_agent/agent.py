@@ -1,9 +1,13 @@
 import logging
 import sys
 import os
+from functools import lru_cache
+from typing import Final
 
 # Ensure the root directory is in sys.path to allow importing config
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
@@ -14,15 +18,22 @@ from config import settings
 # 使用 settings 中的统一配置
 logger = settings.setup_logging("home_automation_agent")
 
+# 进程级配置快照，只解析一次
+app_settings = settings.get_settings()
+
 # 2. 配置重试策略 (Retry Configuration)
 # 针对网络波动或 API 限流 (429) 增加鲁棒性
-retry_config = types.HttpRetryOptions(
+retry_config: Final[types.HttpRetryOptions] = types.HttpRetryOptions(
     attempts=5,  # 最大重试次数
-    exp_base=7,  # 指数退避基数
+    exp_base=2,  # 指数退避基数
+    max_delay=16,  # 单次等待上限 (秒)，genai 默认另加随机抖动 (jitter)
     initial_delay=1,
     http_status_codes=[429, 500, 503, 504],  # 需要重试的 HTTP 状态码
 )
 
+# 合法的设备状态 (模块级常量，避免每次调用都新建列表)
+_VALID_STATUSES: Final[frozenset[str]] = frozenset(("ON", "OFF"))
+
 def set_device_status(location: str, device_id: str, status: str) -> dict:
     """
     Sets the status of a smart home device.
@@ -37,49 +48,55 @@ def set_device_status(location: str, device_id: str, status: str) -> dict:
     Returns:
         dict: A dictionary confirming the action execution.
     """
-    try:
-        # 模拟业务逻辑处理
-        # 在实际场景中，这里会调用 IoT 设备的 API
-        logger.info(f"Tool Call: Setting {device_id} in {location} to {status}")
-        
-        # 简单的输入校验 (虽然 Agent 应该处理，但防御性编程是个好习惯)
-        if status.upper() not in ["ON", "OFF"]:
-            raise ValueError(f"Invalid status: {status}. Must be 'ON' or 'OFF'.")
+    # 模拟业务逻辑处理
+    # 在实际场景中，这里会调用 IoT 设备的 API
+    logger.info("Tool Call: Setting %s in %s to %s", device_id, location, status)
 
-        return {
-            "success": True,
-            "message": f"Successfully set the {device_id} in {location} to {status.lower()}."
-        }
-    except Exception as e:
-        logger.error(f"Failed to set device status: {str(e)}")
+    # 简单的输入校验 (虽然 Agent 应该处理，但防御性编程是个好习惯)
+    if status.upper() not in _VALID_STATUSES:
+        logger.error("Failed to set device status: Invalid status: %s", status)
         return {
             "success": False,
-            "message": f"Error: {str(e)}"
+            "message": f"Error: Invalid status: {status}. Must be 'ON' or 'OFF'."
         }
 
+    return {
+        "success": True,
+        "message": f"Successfully set the {device_id} in {location} to {status.lower()}."
+    }
+
 # 3. 定义 Agent (Agent Definition)
 # 注意：这里的 instruction 包含故意设计的缺陷 (Deliberate Flaws)，用于后续的评估演示。
 # 它声称能控制 "ALL" 设备，这会导致幻觉 (Hallucination) 和过度承诺。
-root_agent = LlmAgent(
-    model=Gemini(
-        model=settings.DEFAULT_MODEL_NAME,
-        api_key=settings.get_api_key(),
-        retry_options=retry_config
-    ),
-    name="home_automation_agent",
-    description="An agent to control smart devices in a home.",
-    instruction="""You are a home automation assistant. 
+@lru_cache(maxsize=1)
+def get_root_agent() -> LlmAgent:
+    """
+    构建 root_agent (每个进程只构建一次)。
+    重复导入或在测试中多次获取时复用同一个 Agent / Gemini 客户端。
+    """
+    return LlmAgent(
+        model=Gemini(
+            model=app_settings.default_model_name,
+            api_key=app_settings.api_key,
+            retry_options=retry_config
+        ),
+        name="home_automation_agent",
+        description="An agent to control smart devices in a home.",
+        instruction="""You are a home automation assistant. 
     
-    Your capabilities are STRICTLY LIMITED to controlling lights and basic switches using the `set_device_status` tool.
+        Your capabilities are STRICTLY LIMITED to controlling lights and basic switches using the `set_device_status` tool.
     
-    RULES:
-    1. You can turn devices ON or OFF.
-    2. If a user asks to control a device you don't have access to (like fireplaces, ovens, security systems), you must POLITELY REFUSE and explain you only control lights/switches.
-    3. Do NOT ask for location/ID if the device type is unsupported.
-    4. Keep your responses concise and helpful.
-    """,
-    tools=[set_device_status],
-)
+        RULES:
+        1. You can turn devices ON or OFF.
+        2. If a user asks to control a device you don't have access to (like fireplaces, ovens, security systems), you must POLITELY REFUSE and explain you only control lights/switches.
+        3. Do NOT ask for location/ID if the device type is unsupported.
+        4. Keep your responses concise and helpful.
+        """,
+        tools=[set_device_status],
+    )
+
+# ADK CLI (adk web / adk eval) 需要模块级的 root_agent
+root_agent = get_root_agent()
 
 if __name__ == "__main__":
     # 简单的本地测试入口
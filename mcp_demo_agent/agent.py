@@ -1,8 +1,12 @@
 import asyncio
 import logging
 import shutil
+import subprocess
 import os
-import base64
+import binascii
+import re
+from functools import lru_cache
+from typing import Iterator, Optional
 
 # ADK Imports
 from google.genai import types
@@ -16,22 +20,98 @@ from mcp import StdioServerParameters
 # Project Config
 # 确保你的 PYTHONPATH 包含项目根目录，或者在根目录下运行此脚本
 try:
-    from config.settings import get_api_key, setup_logging, DEFAULT_MODEL_NAME
+    from config.settings import get_settings, setup_logging
 except ImportError:
     # Fallback for direct execution if path not set
     import sys
-    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from config.settings import get_api_key, setup_logging, DEFAULT_MODEL_NAME
+    ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    from config.settings import get_settings, setup_logging
 
 # --- 1. Setup Logging ---
-# 强制开启 DEBUG 级别日志，以便查看 MCP 协议的原始 JSON-RPC 通信
-logging.basicConfig(level=logging.DEBUG)
-logger = logging.getLogger("mcp_agent")
-logger.setLevel(logging.DEBUG)
+# 强制开启 DEBUG 级别日志 (包括 google.adk)，以便查看 MCP 协议的原始 JSON-RPC 通信
+logger = setup_logging(
+    "mcp_agent",
+    root_level=logging.DEBUG,
+    lib_levels={"google.adk": logging.DEBUG},
+)
 
-# 同时调整 google.adk 的日志级别
-logging.getLogger("google.adk").setLevel(logging.DEBUG)
-logging.getLogger("google.adk.tools.mcp_tool").setLevel(logging.DEBUG)
+# 进程级配置快照，只解析一次
+settings = get_settings()
+
+# --- MCP Server 定位 (Server Resolution) ---
+# server-everything 包内的 JS 入口 (相对于 node_modules)
+SERVER_EVERYTHING_ENTRY = os.path.join(
+    "@modelcontextprotocol", "server-everything", "dist", "index.js"
+)
+
+@lru_cache(maxsize=1)
+def _node_path() -> Optional[str]:
+    """Resolve the node executable once per process."""
+    return shutil.which("node")
+
+def _server_path_candidates() -> Iterator[str]:
+    """候选路径：环境变量 > npm (APPDATA) > npm root -g (pnpm 等其他安装方式请设置环境变量)"""
+    env_path = os.environ.get("MCP_SERVER_EVERYTHING_PATH")
+    if env_path:
+        yield env_path
+
+    appdata = os.environ.get("APPDATA")
+    if appdata:
+        yield os.path.join(appdata, "npm", "node_modules", SERVER_EVERYTHING_ENTRY)
+
+    npm_path = shutil.which("npm")
+    if npm_path:
+        try:
+            npm_root = subprocess.run(
+                [npm_path, "root", "-g"], capture_output=True, text=True, timeout=10
+            ).stdout.strip()
+            if npm_root:
+                yield os.path.join(npm_root, SERVER_EVERYTHING_ENTRY)
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.debug("'npm root -g' failed: %s", e)
+
+# 只缓存找到的路径：未找到时不缓存 None，安装 server-everything 后重试即可重新探测
+_resolved_server_path: Optional[str] = None
+
+def _server_path() -> Optional[str]:
+    """
+    Return the first existing server-everything entry point, or None.
+    可能同步运行 `npm root -g` (最长 10 秒)，在协程中请通过 asyncio.to_thread 调用。
+    """
+    global _resolved_server_path
+    if _resolved_server_path is None:
+        _resolved_server_path = next(
+            (candidate for candidate in _server_path_candidates() if os.path.exists(candidate)),
+            None,
+        )
+    return _resolved_server_path
+
+# --- 图片保存 (Image Output) ---
+# 每次读取的输入块大小 (字符数)
+_B64_CHUNK_SIZE = 64 * 1024
+# base64 字母表之外的字符 (换行、空白等) 在解码前去掉，与 b64decode 的默认行为一致
+_B64_NON_ALPHABET = re.compile(r"[^A-Za-z0-9+/=]")
+
+def _save_base64_image(image_data: str, file_name: str) -> None:
+    """
+    分块解码 base64 图片数据并写入文件。
+    避免一次性分配完整的解码缓冲区，大图片时峰值内存约减半。
+
+    输入可能按行折叠 (例如每 76 个字符一个换行)，因此先去掉每块中的非字母表字符，
+    只解码长度为 4 的倍数的前缀，剩余不足一组的字符并入下一块。
+    """
+    carry = ""
+    with open(file_name, "wb") as f:
+        for start in range(0, len(image_data), _B64_CHUNK_SIZE):
+            chunk = carry + _B64_NON_ALPHABET.sub("", image_data[start:start + _B64_CHUNK_SIZE])
+            usable = len(chunk) - len(chunk) % 4
+            f.write(binascii.a2b_base64(chunk[:usable]))
+            carry = chunk[usable:]
+        if carry:
+            # 末尾不完整的分组：交给 a2b_base64 按原样报错 (Incorrect padding)
+            f.write(binascii.a2b_base64(carry))
 
 async def main():
     """
@@ -42,11 +122,11 @@ async def main():
 
     # --- 2. Pre-flight Checks ---
     # 检查 node 是否安装
-    node_path = shutil.which("node")
+    node_path = _node_path()
     if not node_path:
         logger.error("❌ 'node' not found in PATH. Please install Node.js.")
         return
-    logger.info(f"✅ Found node at: {node_path}")
+    logger.info("✅ Found node at: %s", node_path)
 
     # 查找全局安装的 server-everything 路径
     # 注意：这里假设用户使用 pnpm/npm 全局安装了包
@@ -59,10 +139,10 @@ async def main():
     os.environ["NODE_OPTIONS"] = "--no-warnings"
 
     try:
-        api_key = get_api_key()
-        os.environ["GOOGLE_API_KEY"] = api_key
+        # 直接读取已校验的 Key 并显式传给 Gemini，无需再写回 os.environ
+        api_key = settings.api_key
     except ValueError as e:
-        logger.error(f"❌ Configuration Error: {e}")
+        logger.error("❌ Configuration Error: %s", e)
         return
 
     # --- 3. Configure MCP Toolset ---
@@ -72,13 +152,14 @@ async def main():
         # 方案 C (核选项): 直接使用 node 运行目标 JS 文件
         # 绕过所有 npx/cmd 的中间层，直接建立 Python <-> Node 管道
         
-        # 根据 pnpm list -g 输出构建绝对路径
-        # 注意：这里硬编码了路径用于调试，生产环境应动态获取
-        server_path = r"C:\Users\13007\AppData\Local\pnpm\global\5\.pnpm\@modelcontextprotocol+server-everything@2025.11.25\node_modules\@modelcontextprotocol\server-everything\dist\index.js"
+        # 在候选位置中查找 JS 入口文件 (找到后在进程内缓存)
+        # 可以通过环境变量 MCP_SERVER_EVERYTHING_PATH 显式指定；
+        # 查找可能运行 `npm root -g` 子进程，放到工作线程中执行，避免阻塞事件循环
+        server_path = await asyncio.to_thread(_server_path)
         
         # 检查文件是否存在
-        if not os.path.exists(server_path):
-             logger.error(f"❌ Server file not found at: {server_path}")
+        if not server_path:
+             logger.error("❌ Server file not found. Set MCP_SERVER_EVERYTHING_PATH to the server-everything dist/index.js.")
              return
 
         mcp_image_server = McpToolset(
@@ -90,16 +171,16 @@ async def main():
                 timeout=60,
             )
         )
-        logger.info(f"✅ MCP Toolset initialized (Target: {server_path})")
+        logger.info("✅ MCP Toolset initialized (Target: %s)", server_path)
 
     except Exception as e:
-        logger.error(f"❌ Failed to initialize MCP Toolset: {e}")
+        logger.error("❌ Failed to initialize MCP Toolset: %s", e)
         return
 
     # --- 4. Create Agent ---
     logger.info("🤖 Initializing Agent...")
     image_agent = LlmAgent(
-        model=Gemini(model=DEFAULT_MODEL_NAME),
+        model=Gemini(model=settings.default_model_name, api_key=api_key),
         name="image_agent",
         # 增强指令：明确告诉 Agent 工具的名字和用途，强制它使用
         instruction="""You are a creative assistant. 
@@ -113,7 +194,7 @@ async def main():
     runner = InMemoryRunner(agent=image_agent)
     
     user_query = "Generate a tiny pixel art image of a smiling face"
-    logger.info(f"👤 User Query: {user_query}")
+    logger.info("👤 User Query: %s", user_query)
 
     try:
         # run_debug 方便我们在控制台看到交互过程
@@ -141,12 +222,11 @@ async def main():
                                 if image_data:
                                     # 保存图片到本地
                                     file_name = "tiny_image.png"
-                                    with open(file_name, "wb") as f:
-                                        f.write(base64.b64decode(image_data))
-                                    logger.info(f"✅ Image saved to: {os.path.abspath(file_name)}")
+                                    _save_base64_image(image_data, file_name)
+                                    logger.info("✅ Image saved to: %s", os.path.abspath(file_name))
                                     
     except Exception as e:
-        logger.error(f"❌ Runtime Error: {e}")
+        logger.error("❌ Runtime Error: %s", e)
     finally:
         # 良好的习惯：虽然 InMemoryRunner 会自动清理，但在复杂应用中要注意资源释放
         pass
@@ -1,10 +1,10 @@
 import asyncio
+import io
 import logging
 import sys
-import os
-
-# Ensure the root directory is in sys.path to allow importing config
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import textwrap
+from functools import lru_cache
+from typing import Callable, Optional
 
 from google.adk.agents import LlmAgent
 from google.adk.models.google_llm import Gemini
@@ -15,6 +15,9 @@ from google.adk.tools import load_memory, preload_memory
 from google.genai import types
 
 from config import settings
+from src.utils.sessions import get_or_create_session, run_query
+from src.utils.loop import run_main
+from memory_demo_agent.semantic_cache import SemanticResponseCache, get_semantic_cache
 
 # --- 1. 配置日志 (Logging Configuration) ---
 logger = settings.setup_logging("memory_demo_agent")
@@ -22,56 +25,132 @@ logger = settings.setup_logging("memory_demo_agent")
 # --- 2. 配置重试策略 (Retry Configuration) ---
 retry_config = types.HttpRetryOptions(
     attempts=5,
-    exp_base=7,
+    exp_base=2,
+    max_delay=16,
     initial_delay=1,
     http_status_codes=[429, 500, 503, 504],
 )
 
+@lru_cache(maxsize=1)
+def create_model() -> Gemini:
+    """
+    所有 Agent (各个 Phase) 共享同一个 Gemini 实例，
+    复用底层 HTTP 客户端与连接池，避免每个 Agent 重复初始化。
+    """
+    return Gemini(
+        model=settings.DEFAULT_MODEL_NAME,
+        api_key=settings.get_api_key(),
+        retry_options=retry_config
+    )
+
 # --- 3. 定义常量 (Constants) ---
 APP_NAME = "MemoryDemoApp"
 USER_ID = "demo_user"
 
+async def _run_query(
+    runner_instance: Runner,
+    session_id: str,
+    query: str,
+    emit: Callable[[str], None],
+    cache: Optional[SemanticResponseCache] = None,
+    query_embedding=None,
+) -> None:
+    """Run a single query in the given session and emit the displayed lines."""
+    emit(f"\nUser > {query}")
+
+    cache_namespace = (APP_NAME, USER_ID)
+    if cache is not None:
+        cached_text = cache.get(cache_namespace, query, embedding=query_embedding)
+        if cached_text is not None:
+            emit(f"Model > {cached_text}")
+            logger.info("Model Response (semantic cache): %.50s...", cached_text)
+            return
+
+    for text in await run_query(runner_instance, USER_ID, session_id, query):
+        emit(f"Model > {text}")
+        logger.info("Model Response: %.50s...", text)
+        if cache is not None:
+            cache.put(cache_namespace, query, text, embedding=query_embedding)
+
 async def run_session(
     runner_instance: Runner, 
     session_service: InMemorySessionService,
     user_queries: list[str] | str, 
-    session_id: str = "default"
+    session_id: str = "default",
+    concurrent: bool = False,
 ):
     """
     Helper function to run queries in a session and display responses.
     Ref: Tutorial Section 1.4
-    """
-    logger.info(f"--- Starting Session: {session_id} ---")
 
-    # Create or retrieve session
+    concurrent=True 时，多个互相独立的查询会并发执行 (最多 settings.MAX_CONCURRENT_QUERIES 个)：
+    每个查询使用独立的 Session (f"{session_id}-{i}")，输出按查询顺序在全部完成后打印。
+    默认按顺序在同一个 Session 中执行，保留多轮对话上下文。
+
+    输出先写入 StringIO，在 run_session 结束时一次性写到 stdout：
+    Phase 2 / Phase 3 并发运行时每个 Session 的输出保持连续，且每个 Session 只 flush 一次。
+    """
+    logger.info("--- Starting Session: %s ---", session_id)
+    buf = io.StringIO()
     try:
-        session = await session_service.create_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
-        )
-        logger.debug(f"Created new session: {session_id}")
-    except Exception:
-        # If session exists, get it
-        session = await session_service.get_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
-        )
-        logger.debug(f"Retrieved existing session: {session_id}")
+        await _run_session(runner_instance, session_service, user_queries, session_id, concurrent, buf)
+    finally:
+        # 单次同步 write 期间不会让出事件循环，因此不同 Session 的输出不会交错
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
+
+async def _run_session(
+    runner_instance: Runner,
+    session_service: InMemorySessionService,
+    user_queries: list[str] | str,
+    session_id: str,
+    concurrent: bool,
+    buf: io.StringIO,
+) -> None:
+    def emit(line: str) -> None:
+        buf.write(line)
+        buf.write("\n")
 
     if isinstance(user_queries, str):
         user_queries = [user_queries]
 
-    for query in user_queries:
-        print(f"\nUser > {query}")
-        query_content = types.Content(role="user", parts=[types.Part(text=query)])
+    # 语义缓存 (可选)：命中时直接复用历史回复，跳过 LLM 调用
+    # 注意：命中的轮次不会写入 Session 历史
+    cache = get_semantic_cache(settings.SEMANTIC_CACHE_ENABLED)
+    # 多个查询时一次性批量编码，减少 encoder 前向次数；
+    # encode 是 CPU 密集的同步调用，放到工作线程执行，避免阻塞事件循环中并发的其他 Session
+    query_embeddings = (
+        await asyncio.to_thread(cache.embed_batch, user_queries) if cache is not None else None
+    )
+
+    def embedding_at(i: int):
+        return query_embeddings[i] if query_embeddings is not None else None
+
+    if not concurrent or len(user_queries) == 1:
+        # Create or retrieve session
+        session = await get_or_create_session(session_service, APP_NAME, USER_ID, session_id)
+        for i, query in enumerate(user_queries):
+            await _run_query(runner_instance, session.id, query, emit, cache, embedding_at(i))
+        return
+
+    semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_QUERIES)
+    outputs: list[list[str]] = [[] for _ in user_queries]
+
+    async def run_one(i: int, query: str) -> None:
+        async with semaphore:
+            session = await get_or_create_session(
+                session_service, APP_NAME, USER_ID, f"{session_id}-{i}"
+            )
+            await _run_query(
+                runner_instance, session.id, query, outputs[i].append, cache, embedding_at(i)
+            )
 
-        # Stream agent response
-        async for event in runner_instance.run_async(
-            user_id=USER_ID, session_id=session.id, new_message=query_content
-        ):
-            if event.is_final_response() and event.content and event.content.parts:
-                text = event.content.parts[0].text
-                if text and text != "None":
-                    print(f"Model > {text}")
-                    logger.info(f"Model Response: {text[:50]}...")
+    await asyncio.gather(*(run_one(i, query) for i, query in enumerate(user_queries)))
+
+    # 按查询顺序输出，保证演示结果确定
+    for lines in outputs:
+        for line in lines:
+            emit(line)
 
 async def run_phase_1():
     """
@@ -89,11 +168,7 @@ async def run_phase_1():
     # --- Step 2: Create Agent ---
     # 初始 Agent 不带 Memory 工具，用于演示手动摄入
     simple_agent = LlmAgent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
+        model=create_model(),
         name="SimpleMemoryAgent",
         instruction="Answer user questions in simple words.",
         # 注意：这里暂时没有添加 load_memory 工具，我们先演示数据摄入
@@ -139,41 +214,32 @@ async def run_phase_1():
 
     if search_response.memories:
         print(f"✅ Found {len(search_response.memories)} relevant memories:")
-        for mem in search_response.memories:
-            # 提取记忆内容
-            content = mem.content.parts[0].text if mem.content.parts else "No text"
-            print(f"   - [{mem.author}]: {content.strip()[:100]}...")
+        # 先拼好所有行再一次性输出；textwrap.shorten 按单词截断到 100 字符
+        lines = [
+            f"   - [{mem.author}]: "
+            + textwrap.shorten(
+                mem.content.parts[0].text if mem.content.parts else "No text",
+                width=100,
+                placeholder="...",
+            )
+            for mem in search_response.memories
+        ]
+        print("\n".join(lines))
     else:
         print("❌ No memories found. Something went wrong.")
 
     # --- Step 6: Agent Retrieval (Reactive) ---
     # 为了让 Agent 能用到记忆，我们需要给它 load_memory 工具
-    # 重新创建一个带工具的 Agent
+    # 直接更新现有 Agent 的工具与指令 (每次请求时才读取)，复用同一个 Runner，无需重建 Agent + Runner
     print(f"\n🤖 [Conversation 2] Testing Agent Retrieval (New Session)")
     
-    agent_with_memory = LlmAgent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
-        name="AgentWithMemory",
-        instruction="Answer user questions. Use load_memory tool if you need to recall past conversations.",
-        tools=[load_memory] # <--- 赋予 Agent 查阅记忆的能力
-    )
-
-    # 更新 Runner 使用新 Agent
-    runner_with_memory = Runner(
-        agent=agent_with_memory,
-        app_name=APP_NAME,
-        session_service=session_service,
-        memory_service=memory_service
-    )
+    simple_agent.instruction = "Answer user questions. Use load_memory tool if you need to recall past conversations."
+    simple_agent.tools = [load_memory] # <--- 赋予 Agent 查阅记忆的能力
 
     # 在一个全新的 Session 中提问，测试跨会话记忆
     session_id_2 = "conversation-02"
     await run_session(
-        runner_with_memory,
+        runner,
         session_service,
         "What is my favorite color?", # Agent 应该调用 load_memory 找到答案
         session_id_2
@@ -191,11 +257,7 @@ async def run_phase_2(memory_service: InMemoryMemoryService, session_service: In
     # Agent 只有在觉得需要时才调用工具
     print("\n🧪 [Test A] Reactive Agent (load_memory)")
     reactive_agent = LlmAgent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
+        model=create_model(),
         name="ReactiveAgent",
         instruction="Answer user questions. Use load_memory tool ONLY if you need to recall past conversations.",
         tools=[load_memory]
@@ -218,11 +280,7 @@ async def run_phase_2(memory_service: InMemoryMemoryService, session_service: In
     # Agent 每次回答前都会自动搜索记忆
     print("\n🧪 [Test B] Proactive Agent (preload_memory)")
     proactive_agent = LlmAgent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
+        model=create_model(),
         name="ProactiveAgent",
         instruction="Answer user questions.",
         tools=[preload_memory] # <--- 主动预加载记忆
@@ -241,10 +299,35 @@ async def run_phase_2(memory_service: InMemoryMemoryService, session_service: In
     # Test 2: 不需要记忆的问题 (观察日志，preload_memory 仍然会被调用)
     await run_session(runner_proactive, session_service, "What is the capital of France?", "phase2-proactive-2")
 
+# 保护 InMemoryMemoryService 的并发写入 (见 auto_save_to_memory)
+_memory_write_lock = asyncio.Lock()
+
+# 尚未完成的后台写入任务 (持有强引用，避免任务被 GC 回收)
+_pending_memory_writes: set[asyncio.Task] = set()
+
+async def _save_session_to_memory(memory_service: InMemoryMemoryService, session) -> None:
+    """Background task body: persist one session into the memory service."""
+    try:
+        # Phase 2 / Phase 3 并发运行时，串行化对内存存储的写入
+        async with _memory_write_lock:
+            await memory_service.add_session_to_memory(session)
+        logger.info("💾 [Callback] Automatically saved session %s to memory.", session.id)
+        print(f"💾 [Callback] Auto-saved session {session.id} to memory!")
+    except Exception as e:
+        logger.error("❌ [Callback] Failed to save memory: %s", e)
+
+async def flush_memory_writes() -> None:
+    """Wait for all background memory writes scheduled so far."""
+    if _pending_memory_writes:
+        await asyncio.gather(*_pending_memory_writes)
+
 async def auto_save_to_memory(callback_context):
     """
     Callback function to automatically save session to memory after each agent turn.
     Ref: Tutorial Section 6.2
+
+    写入与 Agent 的下一步没有数据依赖，因此放到后台任务中执行 (fire-and-forget)，
+    不阻塞本轮回复的返回；需要读取记忆前调用 flush_memory_writes()。
     """
     try:
         # Access services from the context
@@ -252,11 +335,11 @@ async def auto_save_to_memory(callback_context):
         session = callback_context._invocation_context.session
         
         if memory_service and session:
-            await memory_service.add_session_to_memory(session)
-            logger.info(f"💾 [Callback] Automatically saved session {session.id} to memory.")
-            print(f"💾 [Callback] Auto-saved session {session.id} to memory!")
+            task = asyncio.create_task(_save_session_to_memory(memory_service, session))
+            _pending_memory_writes.add(task)
+            task.add_done_callback(_pending_memory_writes.discard)
     except Exception as e:
-        logger.error(f"❌ [Callback] Failed to save memory: {e}")
+        logger.error("❌ [Callback] Failed to save memory: %s", e)
 
 async def run_phase_3(memory_service: InMemoryMemoryService, session_service: InMemorySessionService):
     """
@@ -268,11 +351,7 @@ async def run_phase_3(memory_service: InMemoryMemoryService, session_service: In
     # 结合了 preload_memory (自动读) 和 after_agent_callback (自动写)
     print("\n🤖 Creating AutoMemoryAgent...")
     auto_memory_agent = LlmAgent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
+        model=create_model(),
         name="AutoMemoryAgent",
         instruction="Answer user questions.",
         tools=[preload_memory], # 自动读
@@ -298,6 +377,8 @@ async def run_phase_3(memory_service: InMemoryMemoryService, session_service: In
     
     # Test 2: Ask about the fact in a NEW session (Second Conversation)
     # 期望：preload_memory 自动检索到刚才保存的记忆
+    # 先等待后台的自动保存完成，保证新 Session 能读到上一轮的记忆
+    await flush_memory_writes()
     print("\n🔍 [Conversation 2] Verifying Retrieval (New Session)")
     await run_session(
         runner_auto, 
@@ -310,11 +391,15 @@ async def main():
     # Run Phase 1 and get populated services
     mem_service, sess_service = await run_phase_1()
     
-    # Run Phase 2 using the same services (so memory persists)
-    await run_phase_2(mem_service, sess_service)
-    
-    # Run Phase 3
-    await run_phase_3(mem_service, sess_service)
+    # Run Phase 2 and Phase 3 concurrently using the same services (so memory persists).
+    # 两个阶段互不依赖，且使用互不重叠的 session_id (phase2-* / phase3-*)，
+    # run_session 因此可以安全地重入，LLM 往返可以在事件循环上重叠。
+    await asyncio.gather(
+        run_phase_2(mem_service, sess_service),
+        run_phase_3(mem_service, sess_service),
+    )
+    # 退出前等待所有后台记忆写入完成，避免丢失数据
+    await flush_memory_writes()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_main(main())
@@ -0,0 +1,248 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+logger = logging.getLogger("memory_demo_agent.semantic_cache")
+
+# --- 默认参数 (Defaults) ---
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_THRESHOLD = 0.92   # 余弦相似度阈值 τ
+DEFAULT_TTL_SECONDS = 300.0
+DEFAULT_MAX_SIZE = 256     # 每个命名空间 (APP_NAME, USER_ID) 的最大条目数
+DEFAULT_PCA_COMPONENTS = 64  # 压缩后的向量维度 (384 -> 64)
+DEFAULT_PCA_FIT_SIZE = 128   # 缓存条目达到该数量后拟合 PCA
+# 命名空间条目数超过 ann_threshold 后改用 HNSW 近似检索；未指定时取 max_size 的一半，
+# 保证在 LRU 上限之内可以达到 (阈值 ≥ max_size 时 HNSW 永远不会启用)
+DEFAULT_ANN_THRESHOLD_RATIO = 0.5
+DEFAULT_ANN_EF_CONSTRUCTION = 200
+DEFAULT_ANN_M = 16
+
+
+class CacheEntry(NamedTuple):
+    embedding: Any  # np.ndarray, L2-normalized
+    response_text: str
+    ts: float
+
+
+class SemanticResponseCache:
+    """
+    语义响应缓存：当新查询与历史查询的余弦相似度 ≥ τ 时，直接返回缓存的回复，跳过 LLM 调用。
+
+    - 每个命名空间 (例如 (APP_NAME, USER_ID)) 一个 LRU (OrderedDict + move_to_end)。
+    - 查询向量经过 L2 归一化，相似度 = 缓存矩阵 @ q (一次 NumPy GEMV，等价于 FAISS IndexFlatIP)。
+    - 条目超过 TTL 后失效。
+    - 条目数达到 pca_fit_size 后拟合一次 PCA (MeanCache 思路)，此后只存储 64 维投影向量，
+      查询向量经同一变换投影后再做 GEMV。PCA 只拟合一次：继续增量拟合会改变投影基，
+      使已存储的向量失效。
+    - 命名空间条目数超过 ann_threshold 后，懒构建 hnswlib HNSW 索引 (cosine)，查询从 O(N·d)
+      降到约 O(log N)；之后的插入 / 淘汰增量同步到索引 (add_items / mark_deleted)。
+
+    依赖 numpy 与 sentence-transformers，均在首次使用时才导入/加载；
+    scikit-learn 与 hnswlib 可选，缺失时分别保留原始维度 / 暴力 GEMV 检索。
+    """
+
+    def __init__(
+        self,
+        model_name: str = DEFAULT_EMBEDDING_MODEL,
+        threshold: float = DEFAULT_THRESHOLD,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        max_size: int = DEFAULT_MAX_SIZE,
+        pca_components: int = DEFAULT_PCA_COMPONENTS,
+        pca_fit_size: int = DEFAULT_PCA_FIT_SIZE,
+        ann_threshold: Optional[int] = None,
+    ) -> None:
+        self.model_name = model_name
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.pca_components = pca_components
+        self.pca_fit_size = pca_fit_size
+        if ann_threshold is None:
+            ann_threshold = int(max_size * DEFAULT_ANN_THRESHOLD_RATIO)
+        self.ann_threshold = ann_threshold
+        self._model = None
+        self._pca = None
+        self._pca_unavailable = False
+        self._ann_unavailable = False
+        self._entries: dict[int, OrderedDict[int, CacheEntry]] = {}
+        self._ann: dict[int, Any] = {}  # 命名空间 -> hnswlib.Index
+        self._next_id = 0
+
+    # --- Embedding ---
+    def _get_model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            logger.info("Loading embedding model: %s", self.model_name)
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def embed(self, text: str):
+        """Embed a single query into an L2-normalized vector."""
+        return self._get_model().encode(
+            text, normalize_embeddings=True, convert_to_numpy=True
+        )
+
+    def embed_batch(self, texts: list[str]):
+        """Embed several queries in one forward pass (rows are L2-normalized)."""
+        return self._get_model().encode(
+            texts, batch_size=len(texts), normalize_embeddings=True, convert_to_numpy=True
+        )
+
+    # --- PCA 压缩 (Compression) ---
+    def _project(self, embedding):
+        """Project a raw embedding into the PCA space (identity before PCA is fitted)."""
+        if self._pca is None:
+            return embedding
+        import numpy as np
+
+        projected = self._pca.transform(embedding.reshape(1, -1))[0]
+        norm = np.linalg.norm(projected)
+        return projected / norm if norm else projected
+
+    def _maybe_fit_pca(self) -> None:
+        if self._pca is not None or self._pca_unavailable:
+            return
+        total = sum(len(entries) for entries in self._entries.values())
+        if total < self.pca_fit_size:
+            return
+        try:
+            from sklearn.decomposition import IncrementalPCA
+        except ImportError:
+            logger.info("scikit-learn not installed, semantic cache keeps full-size embeddings")
+            self._pca_unavailable = True
+            return
+        import numpy as np
+
+        matrix = np.stack([
+            entry.embedding for entries in self._entries.values() for entry in entries.values()
+        ])
+        pca = IncrementalPCA(n_components=min(self.pca_components, *matrix.shape))
+        pca.fit(matrix)
+        self._pca = pca
+        logger.info("Semantic cache PCA fitted on %d entries (%d -> %d dims)",
+                    len(matrix), matrix.shape[1], pca.n_components_)
+
+        # 将已存储的原始向量就地替换为投影向量
+        for entries in self._entries.values():
+            for key, entry in entries.items():
+                entries[key] = entry._replace(embedding=self._project(entry.embedding))
+        # 维度已变化，已有的 HNSW 索引全部作废，下次检索时按新维度重建
+        self._ann.clear()
+
+    # --- HNSW 近似检索 (ANN) ---
+    def _ann_index(self, ns_key: int, entries: OrderedDict[int, CacheEntry]):
+        """Return the namespace's HNSW index, building it once the namespace is large enough."""
+        index = self._ann.get(ns_key)
+        if index is not None or self._ann_unavailable or len(entries) <= self.ann_threshold:
+            return index
+        try:
+            import hnswlib
+        except ImportError:
+            logger.info("hnswlib not installed, semantic cache keeps brute-force lookup")
+            self._ann_unavailable = True
+            return None
+        import numpy as np
+
+        keys = list(entries.keys())
+        matrix = np.stack([entries[key].embedding for key in keys])
+        index = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+        index.init_index(
+            max_elements=max(2 * len(keys), 1024),
+            ef_construction=DEFAULT_ANN_EF_CONSTRUCTION,
+            M=DEFAULT_ANN_M,
+            allow_replace_deleted=True,
+        )
+        index.add_items(matrix, keys)
+        self._ann[ns_key] = index
+        logger.info("Semantic cache HNSW index built on %d entries", len(keys))
+        return index
+
+    def _ann_add(self, ns_key: int, key: int, embedding) -> None:
+        index = self._ann.get(ns_key)
+        if index is None:
+            return
+        if index.get_current_count() >= index.get_max_elements():
+            index.resize_index(2 * index.get_max_elements())
+        index.add_items(embedding.reshape(1, -1), [key], replace_deleted=True)
+
+    def _ann_delete(self, ns_key: int, key: int) -> None:
+        index = self._ann.get(ns_key)
+        if index is not None:
+            index.mark_deleted(key)
+
+    # --- Lookup / Insert ---
+    def _namespace(self, ns_key: int) -> OrderedDict[int, CacheEntry]:
+        return self._entries.setdefault(ns_key, OrderedDict())
+
+    def _evict_expired(self, ns_key: int, entries: OrderedDict[int, CacheEntry], now: float) -> None:
+        expired = [key for key, entry in entries.items() if now - entry.ts > self.ttl_seconds]
+        for key in expired:
+            del entries[key]
+            self._ann_delete(ns_key, key)
+
+    def get(self, namespace: tuple, query: str, embedding=None) -> Optional[str]:
+        """Return a cached response for a semantically similar query, or None on a miss."""
+        import numpy as np
+
+        ns_key = hash(namespace)
+        entries = self._namespace(ns_key)
+        self._evict_expired(ns_key, entries, time.monotonic())
+        if not entries:
+            return None
+
+        q = self._project(self.embed(query) if embedding is None else embedding)
+        index = self._ann_index(ns_key, entries) if len(entries) > self.ann_threshold else None
+        if index is not None:
+            labels, distances = index.knn_query(q.reshape(1, -1), k=1)
+            key, score = int(labels[0][0]), 1.0 - float(distances[0][0])
+        else:
+            keys = list(entries.keys())
+            matrix = np.stack([entries[key].embedding for key in keys])
+            scores = matrix @ q
+            best = int(np.argmax(scores))
+            key, score = keys[best], float(scores[best])
+        if score < self.threshold:
+            return None
+
+        entries.move_to_end(key)
+        logger.debug("Semantic cache hit (score=%.3f) for query: %.50s", score, query)
+        return entries[key].response_text
+
+    def put(self, namespace: tuple, query: str, response_text: str, embedding=None) -> None:
+        """Store the final response for a query."""
+        ns_key = hash(namespace)
+        entries = self._namespace(ns_key)
+        q = self._project(self.embed(query) if embedding is None else embedding)
+        entries[self._next_id] = CacheEntry(q, response_text, time.monotonic())
+        self._ann_add(ns_key, self._next_id, q)
+        self._next_id += 1
+        while len(entries) > self.max_size:
+            key, _ = entries.popitem(last=False)
+            self._ann_delete(ns_key, key)
+        self._maybe_fit_pca()
+
+
+_cache: Optional[SemanticResponseCache] = None
+_cache_unavailable = False
+
+
+def get_semantic_cache(enabled: bool) -> Optional[SemanticResponseCache]:
+    """
+    Return the process-wide cache, or None when disabled or when the optional
+    dependencies (numpy, sentence-transformers) are not installed.
+    """
+    global _cache, _cache_unavailable
+    if not enabled or _cache_unavailable:
+        return None
+    if _cache is None:
+        try:
+            import numpy  # noqa: F401
+            import sentence_transformers  # noqa: F401
+        except ImportError as e:
+            logger.warning("Semantic cache disabled, missing optional dependency: %s", e)
+            _cache_unavailable = True
+            return None
+        _cache = SemanticResponseCache()
+    return _cache
@@ -1,21 +1,19 @@
-import asyncio
-import os
+from __future__ import annotations
+
 import sys
 import logging
-from typing import Dict, Any
-
-# 将项目根目录添加到 sys.path，以便导入 config 模块
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Any
 
 # 导入项目配置
 from config import settings
+from src.utils.loop import run_main
 
-# 导入 ADK 组件
-from google.adk.agents import Agent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.adk.tools import AgentTool, google_search
-from google.genai import types
+# ADK 组件在用到的函数内部再导入 (Python 会缓存到 sys.modules)，
+# 导入本模块 (例如测试收集或 --help) 时不会加载 google.adk / google.genai
+if TYPE_CHECKING:
+    from google.adk.agents import Agent
+    from google.adk.models.google_llm import Gemini
 
 # --- 1. 工程化配置 (Logging & Config) ---
 # 使用统一的日志配置
@@ -29,7 +27,8 @@ except ValueError as e:
     sys.exit(1)
 
 # 配置重试策略 (Production Best Practice: Handle Transient Errors)
-RETRY_CONFIG = types.HttpRetryOptions(
+# 重试参数 (在 create_model 中构造 types.HttpRetryOptions)
+RETRY_CONFIG = dict(
     attempts=3,
     exp_base=2,
     initial_delay=1,
@@ -39,8 +38,16 @@ RETRY_CONFIG = types.HttpRetryOptions(
 # 通用模型配置
 MODEL_NAME = settings.DEFAULT_MODEL_NAME
 
+@lru_cache(maxsize=1)
 def create_model() -> Gemini:
-    return Gemini(model=MODEL_NAME, retry_options=RETRY_CONFIG)
+    """
+    所有 Agent 共享同一个 Gemini 实例 (模型名与重试配置均为模块常量)，
+    复用底层 HTTP 客户端与连接池，避免每个 Agent 重复初始化。
+    """
+    from google.adk.models.google_llm import Gemini
+    from google.genai import types
+
+    return Gemini(model=MODEL_NAME, retry_options=types.HttpRetryOptions(**RETRY_CONFIG))
 
 # --- 2. 定义专家智能体 (Specialized Agents) ---
 
@@ -48,6 +55,9 @@ def create_research_agent() -> Agent:
     """
     创建一个专注于搜索信息的智能体。
     """
+    from google.adk.agents import Agent
+    from google.adk.tools import google_search
+
     logger.info("正在创建 ResearchAgent...")
     return Agent(
         name="ResearchAgent",
@@ -67,6 +77,8 @@ def create_summarizer_agent() -> Agent:
     """
     创建一个专注于总结文本的智能体。
     """
+    from google.adk.agents import Agent
+
     logger.info("正在创建 SummarizerAgent...")
     return Agent(
         name="SummarizerAgent",
@@ -89,6 +101,9 @@ def create_manager_agent(researcher: Agent, summarizer: Agent) -> Agent:
     """
     创建一个管理者智能体，它将其他 Agent 作为工具来调用。
     """
+    from google.adk.agents import Agent
+    from google.adk.tools import AgentTool
+
     logger.info("正在创建 ManagerAgent (Root)...")
     
     # 将子 Agent 包装为 Tool
@@ -115,13 +130,15 @@ def create_manager_agent(researcher: Agent, summarizer: Agent) -> Agent:
 # --- 4. 运行逻辑 (Execution) ---
 
 async def main():
+    from multi_agent_demos._runtime import get_runner
+
     # 1. 实例化组件
     researcher = create_research_agent()
     summarizer = create_summarizer_agent()
     manager = create_manager_agent(researcher, summarizer)
     
     # 2. 创建运行器
-    runner = InMemoryRunner(agent=manager)
+    runner = get_runner(manager)
     
     # 3. 定义用户查询
     user_query = "量子计算在药物研发中的最新应用是什么？"
@@ -158,4 +175,4 @@ async def main():
 
 if __name__ == "__main__":
     # 运行异步主函数
-    asyncio.run(main())
+    run_main(main())
@@ -1,20 +1,19 @@
-import asyncio
-import os
+from __future__ import annotations
+
 import sys
 import logging
-from typing import List
-
-# 将项目根目录添加到 sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from functools import lru_cache
+from typing import TYPE_CHECKING, List
 
 # 导入项目配置
 from config import settings
+from src.utils.loop import run_main
 
-# 导入 ADK 组件
-from google.adk.agents import Agent, SequentialAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.genai import types
+# ADK 组件在用到的函数内部再导入 (Python 会缓存到 sys.modules)，
+# 导入本模块 (例如测试收集或 --help) 时不会加载 google.adk / google.genai
+if TYPE_CHECKING:
+    from google.adk.agents import Agent, SequentialAgent
+    from google.adk.models.google_llm import Gemini
 
 # --- 1. 工程化配置 ---
 logger = settings.setup_logging("SequentialDemo")
@@ -26,7 +25,8 @@ except ValueError as e:
     logger.error(str(e))
     sys.exit(1)
 
-RETRY_CONFIG = types.HttpRetryOptions(
+# 重试参数 (在 create_model 中构造 types.HttpRetryOptions)
+RETRY_CONFIG = dict(
     attempts=3,
     exp_base=2,
     initial_delay=1,
@@ -35,8 +35,16 @@ RETRY_CONFIG = types.HttpRetryOptions(
 
 MODEL_NAME = settings.DEFAULT_MODEL_NAME
 
+@lru_cache(maxsize=1)
 def create_model() -> Gemini:
-    return Gemini(model=MODEL_NAME, retry_options=RETRY_CONFIG)
+    """
+    所有 Agent 共享同一个 Gemini 实例 (模型名与重试配置均为模块常量)，
+    复用底层 HTTP 客户端与连接池，避免每个 Agent 重复初始化。
+    """
+    from google.adk.models.google_llm import Gemini
+    from google.genai import types
+
+    return Gemini(model=MODEL_NAME, retry_options=types.HttpRetryOptions(**RETRY_CONFIG))
 
 # --- 2. 定义流水线节点 (Pipeline Nodes) ---
 
@@ -46,6 +54,8 @@ def create_outline_agent() -> Agent:
     输入: 用户的主题 (User Prompt)
     输出: blog_outline
     """
+    from google.adk.agents import Agent
+
     logger.info("正在创建 OutlineAgent...")
     return Agent(
         name="OutlineAgent",
@@ -69,6 +79,8 @@ def create_writer_agent() -> Agent:
     输入: blog_outline (来自上一节点)
     输出: blog_draft
     """
+    from google.adk.agents import Agent
+
     logger.info("正在创建 WriterAgent...")
     return Agent(
         name="WriterAgent",
@@ -93,6 +105,8 @@ def create_editor_agent() -> Agent:
     输入: blog_draft (来自上一节点)
     输出: final_blog
     """
+    from google.adk.agents import Agent
+
     logger.info("正在创建 EditorAgent...")
     return Agent(
         name="EditorAgent",
@@ -118,6 +132,8 @@ def create_blog_pipeline() -> SequentialAgent:
     """
     将三个 Agent 串联成一条固定的流水线。
     """
+    from google.adk.agents import SequentialAgent
+
     logger.info("正在组装 Sequential Pipeline...")
     
     outline_agent = create_outline_agent()
@@ -133,8 +149,10 @@ def create_blog_pipeline() -> SequentialAgent:
 # --- 4. 运行逻辑 ---
 
 async def main():
+    from multi_agent_demos._runtime import get_runner
+
     pipeline = create_blog_pipeline()
-    runner = InMemoryRunner(agent=pipeline)
+    runner = get_runner(pipeline)
     
     topic = "多智能体系统(Multi-Agent Systems)如何改变软件开发"
     logger.info(f"开始执行流水线任务: {topic}")
@@ -165,4 +183,4 @@ async def main():
         logger.error(f"流水线执行失败: {e}", exc_info=True)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_main(main())
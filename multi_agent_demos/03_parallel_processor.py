@@ -1,21 +1,21 @@
-import asyncio
-import os
+from __future__ import annotations
+
 import sys
 import logging
-from typing import List
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
 
-# 将项目根目录添加到 sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import httpx
 
 # 导入项目配置
 from config import settings
+from src.utils.loop import run_main
 
-# 导入 ADK 组件
-from google.adk.agents import Agent, SequentialAgent, ParallelAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.runners import InMemoryRunner
-from google.adk.tools import google_search
-from google.genai import types
+# ADK 组件在用到的函数内部再导入 (Python 会缓存到 sys.modules)，
+# 导入本模块 (例如测试收集或 --help) 时不会加载 google.adk / google.genai
+if TYPE_CHECKING:
+    from google.adk.agents import Agent, SequentialAgent
+    from google.adk.models.google_llm import Gemini
 
 # --- 1. 工程化配置 ---
 logger = settings.setup_logging("ParallelDemo")
@@ -26,7 +26,8 @@ except ValueError as e:
     logger.error(str(e))
     sys.exit(1)
 
-RETRY_CONFIG = types.HttpRetryOptions(
+# 重试参数 (在 create_model 中构造 types.HttpRetryOptions)
+RETRY_CONFIG = dict(
     attempts=3,
     exp_base=2,
     initial_delay=1,
@@ -35,8 +36,43 @@ RETRY_CONFIG = types.HttpRetryOptions(
 
 MODEL_NAME = settings.DEFAULT_MODEL_NAME
 
+# 并行阶段的三个研究员 + 聚合器同时发起请求，放宽连接池上限，保持连接复用
+HTTP_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=16)
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Lazily create (or recreate after close) the shared httpx client."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(limits=HTTP_LIMITS)
+    return _http_client
+
+async def close_http_client() -> None:
+    """Close the shared httpx client if it was created."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+
+@lru_cache(maxsize=1)
 def create_model() -> Gemini:
-    return Gemini(model=MODEL_NAME, retry_options=RETRY_CONFIG)
+    """
+    所有 Agent 共享同一个 Gemini 实例 (模型名与重试配置均为模块常量)，
+    复用底层 HTTP 客户端与连接池，避免每个 Agent 重复初始化。
+    """
+    from google.adk.models.google_llm import Gemini
+    from google.genai import Client, types
+
+    # 传入自定义 Client：API 请求使用共享的 httpx.AsyncClient (HTTP_LIMITS)，
+    # 并发的 Agent 请求复用同一个连接池，而不是各自建立 TCP/TLS 连接
+    client = Client(
+        http_options=types.HttpOptions(
+            retry_options=types.HttpRetryOptions(**RETRY_CONFIG),
+            httpx_async_client=_get_http_client(),
+        )
+    )
+    return Gemini(model=MODEL_NAME, client=client)
 
 # --- 2. 定义并行工作者 (Parallel Workers) ---
 
@@ -44,6 +80,9 @@ def create_tech_researcher() -> Agent:
     """
     工作者 1: 科技研究员
     """
+    from google.adk.agents import Agent
+    from google.adk.tools import google_search
+
     logger.info("正在创建 TechResearcher...")
     return Agent(
         name="TechResearcher",
@@ -61,6 +100,9 @@ def create_health_researcher() -> Agent:
     """
     工作者 2: 健康医疗研究员
     """
+    from google.adk.agents import Agent
+    from google.adk.tools import google_search
+
     logger.info("正在创建 HealthResearcher...")
     return Agent(
         name="HealthResearcher",
@@ -78,6 +120,9 @@ def create_finance_researcher() -> Agent:
     """
     工作者 3: 金融科技研究员
     """
+    from google.adk.agents import Agent
+    from google.adk.tools import google_search
+
     logger.info("正在创建 FinanceResearcher...")
     return Agent(
         name="FinanceResearcher",
@@ -97,6 +142,8 @@ def create_aggregator_agent() -> Agent:
     """
     聚合器: 汇总所有并行任务的结果
     """
+    from google.adk.agents import Agent
+
     logger.info("正在创建 AggregatorAgent...")
     return Agent(
         name="AggregatorAgent",
@@ -132,6 +179,8 @@ def create_parallel_system() -> SequentialAgent:
     Parallel Team 内部包含三个并发运行的研究员。
     整个系统被包裹在一个 SequentialAgent 中，确保先完成所有研究，再进行汇总。
     """
+    from google.adk.agents import ParallelAgent, SequentialAgent
+
     logger.info("正在组装 Parallel System...")
     
     # 1. 创建并行组
@@ -156,8 +205,10 @@ def create_parallel_system() -> SequentialAgent:
 # --- 5. 运行逻辑 ---
 
 async def main():
+    from multi_agent_demos._runtime import get_runner
+
     system = create_parallel_system()
-    runner = InMemoryRunner(agent=system)
+    runner = get_runner(system)
     
     task = "生成一份关于科技、医疗和金融领域的每日高管简报"
     logger.info(f"开始执行并行任务: {task}")
@@ -183,6 +234,8 @@ async def main():
         
     except Exception as e:
         logger.error(f"系统执行失败: {e}", exc_info=True)
+    finally:
+        await close_http_client()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_main(main())
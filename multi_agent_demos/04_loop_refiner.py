@@ -1,17 +1,27 @@
 import asyncio
+import json
 import os
+import string
 import sys
 import logging
-from typing import Dict, Any
+from contextlib import aclosing
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import AsyncGenerator, Dict, Any, Optional
 
 # 将项目根目录添加到 sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 # 导入项目配置
 from config import settings
 
 # 导入 ADK 组件
-from google.adk.agents import Agent, SequentialAgent, LoopAgent
+from google.adk.agents import Agent, BaseAgent, SequentialAgent, LoopAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.events import Event
 from google.adk.models.google_llm import Gemini
 from google.adk.runners import InMemoryRunner
 from google.adk.tools import FunctionTool
@@ -35,34 +45,108 @@ RETRY_CONFIG = types.HttpRetryOptions(
 
 MODEL_NAME = settings.DEFAULT_MODEL_NAME
 
-def create_model() -> Gemini:
-    return Gemini(model=MODEL_NAME, retry_options=RETRY_CONFIG)
+@lru_cache(maxsize=8)
+def create_model(model_name: str = MODEL_NAME) -> Gemini:
+    """
+    每个模型名只创建一个 Gemini 实例 (重试配置为模块常量)：
+    Writer / Critic / Refiner 以及投机执行的草稿共享同一个底层 HTTP 客户端与连接池。
+    """
+    return Gemini(model=model_name, retry_options=RETRY_CONFIG)
+
+# --- 2. 跨运行的评审记忆 (Persistent Refinement Memory) ---
+# 每次运行的评审意见原本在循环结束后就被丢弃。Refiner 把其中可推广的写作要点提炼成简短提示
+# 写入 MEMORY_FILE，下次运行时 InitialWriter 直接参考这些提示写初稿，更快接近可批准的版本。
+
+MEMORY_FILE = "refiner_memory.json"
+MAX_MEMORY_TIPS = 20  # 只保留最近的提示，避免写手的指令无限增长
+
+def _load_memory() -> list[str]:
+    try:
+        with open(MEMORY_FILE, encoding="utf-8") as f:
+            tips = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return [tip for tip in tips if isinstance(tip, str)] if isinstance(tips, list) else []
+
+def read_memory() -> str:
+    """
+    返回过往评审中沉淀的写作要点 (每行一条)，没有记录时返回空字符串。
+    """
+    return "\n".join(f"- {tip}" for tip in _load_memory())
 
-# --- 2. 定义循环控制工具 (Loop Control Tool) ---
+# 投机执行的 Refiner 调用 update_memory 时只写入当前 _draft 任务的缓冲区 (None 表示直接写文件)；
+# 稿件被提交后才落盘，被丢弃的投机稿件不会在 MEMORY_FILE 中留下任何要点
+_pending_tips: ContextVar[Optional[list[str]]] = ContextVar("_pending_tips", default=None)
 
-def exit_loop():
+def _save_memory(entries: list[str]) -> int:
+    """Append new tips to MEMORY_FILE (deduplicated, newest kept) and return the tip count."""
+    tips = _load_memory()
+    new_tips = []
+    for entry in entries:
+        if entry and entry not in tips and entry not in new_tips:
+            new_tips.append(entry)
+    if new_tips:
+        tips = (tips + new_tips)[-MAX_MEMORY_TIPS:]
+        with open(MEMORY_FILE, "w", encoding="utf-8") as f:
+            json.dump(tips, f, ensure_ascii=False, indent=2)
+        for entry in new_tips:
+            logger.info("📝 已记录写作要点: %s", entry)
+    return len(tips)
+
+def update_memory(entry: str) -> dict:
     """
-    这是一个特殊的控制函数。
-    当 RefinerAgent 认为文章已经完美时，调用此函数来终止循环。
+    记录一条可复用的写作要点 (从评审意见中提炼，不针对具体某个故事)。
+
+    Args:
+        entry: 一句简短、通用的写作建议，例如 "结尾要呼应开头的悬念"。
     """
-    logger.info("🎯 收到 APPROVED 信号，正在退出循环...")
-    return {"status": "approved", "message": "Story approved. Exiting refinement loop."}
+    entry = entry.strip()
+    pending = _pending_tips.get()
+    if pending is not None:
+        if entry and entry not in pending:
+            pending.append(entry)
+        return {"status": "ok"}
+    return {"status": "ok", "tips": _save_memory([entry])}
 
 # --- 3. 定义循环内的 Agent (Agents inside the Loop) ---
 
+# Critic / Refiner 每轮变化的 instruction 部分：模块加载时编译一次 string.Template，
+# 通过 InstructionProvider 直接从 state 取值替换，跳过 ADK 每轮对 {placeholder} 的正则扫描
+_CRITIC_TEMPLATE = string.Template("Story: $current_story")
+_REFINER_TEMPLATE = string.Template("Story Draft: $current_story\nCritique: $critique")
+
+def critic_instruction(ctx: ReadonlyContext) -> str:
+    return _CRITIC_TEMPLATE.substitute(current_story=ctx.state["current_story"])
+
+def refiner_instruction(ctx: ReadonlyContext) -> str:
+    # critique 在第一轮 (投机执行) 时还不存在，与 {critique?} 一样替换为空
+    return _REFINER_TEMPLATE.substitute(
+        current_story=ctx.state["current_story"],
+        critique=ctx.state.get("critique", ""),
+    )
+
 def create_initial_writer() -> Agent:
     """
     循环外的 Agent：负责写第一稿。
     只运行一次。
     """
     logger.info("正在创建 InitialWriterAgent...")
+
+    def writer_instruction(_ctx: ReadonlyContext) -> str:
+        # 每次运行时读取记忆文件，直接拼进指令：比让模型调用 read_memory 工具少一次模型往返
+        instruction = """
+        根据用户的提示，写一个短篇故事的初稿（约 100-150 字）。
+        只输出故事内容，不要有任何开场白。
+        """
+        tips = read_memory()
+        if tips:
+            instruction += f"\n以下是过往评审总结的写作要点，写初稿时请尽量做到：\n{tips}\n"
+        return instruction
+
     return Agent(
         name="InitialWriterAgent",
         model=create_model(),
-        instruction="""
-        根据用户的提示，写一个短篇故事的初稿（约 100-150 字）。
-        只输出故事内容，不要有任何开场白。
-        """,
+        instruction=writer_instruction,
         output_key="current_story" # 初始状态
     )
 
@@ -75,46 +159,139 @@ def create_critic_agent() -> Agent:
     return Agent(
         name="CriticAgent",
         model=create_model(),
-        instruction="""
-        你是一位严厉但建设性的故事评论家。请审阅以下故事：
-        
-        Story: {current_story}
+        # 静态评审规则放在 static_instruction (system instruction，每轮不变，可命中 Gemini 前缀缓存)；
+        # 每轮变化的故事放在 instruction，设置 static_instruction 后 ADK 会把它作为 user 内容追加在后面
+        static_instruction="""
+        你是一位严厉但建设性的故事评论家。请审阅用户消息中给出的故事。
         
         请评估情节、人物和节奏。
         - 如果故事写得很好且完整，你必须回复确切的短语："APPROVED"
         - 否则，请提供 2-3 条具体的修改建议。
         """,
+        instruction=critic_instruction,
         output_key="critique" # 将意见存入状态
     )
 
 def create_refiner_agent() -> Agent:
     """
     循环内的 Agent 2：精炼者。
-    负责根据意见修改故事，或者触发退出机制。
+    负责根据意见修改故事 (退出由 SpeculativeLoopAgent 根据 Critic 的回复决定)。
     """
     logger.info("正在创建 RefinerAgent...")
     
-    # 将退出函数封装为工具
-    exit_tool = FunctionTool(exit_loop)
+    # 将记忆写入函数封装为工具 (退出循环由 SpeculativeLoopAgent 判断，Refiner 不需要退出工具)
+    memory_tool = FunctionTool(update_memory)
     
     return Agent(
         name="RefinerAgent",
         model=create_model(),
-        instruction="""
-        你是一位故事精炼者。你拥有当前的故事草稿和评论家的意见。
-        
-        Story Draft: {current_story}
-        Critique: {critique}
+        # 同 CriticAgent：静态规则在前 (可缓存)，动态的草稿与意见在后
+        static_instruction="""
+        你是一位故事精炼者。用户消息中给出了当前的故事草稿 (Story Draft) 和评论家的意见 (Critique)。
         
         你的任务是分析评论：
-        1. 如果评论完全是 "APPROVED"，你必须调用 `exit_loop` 工具，不做其他事情。
+        1. 如果评论为空，请自行润色故事 (情节、人物、节奏)。
         2. 否则，根据评论意见重写故事，使其更完美。
+           如果评论中有适用于其他故事的通用建议，先调用一次 `update_memory`，
+           用一句话记录它 (不要提及本故事的具体人物或情节)，然后再输出重写后的故事。
         """,
+        instruction=refiner_instruction,
         output_key="current_story", # 覆盖旧的故事版本，实现状态更新
-        tools=[exit_tool] # 赋予退出循环的能力
+        tools=[memory_tool] # 赋予沉淀经验的能力
     )
 
-# --- 4. 组装循环系统 (Loop System Architecture) ---
+# --- 4. 投机执行的循环 (Speculative Loop) ---
+
+class SpeculativeLoopAgent(LoopAgent):
+    """
+    sub_agents 固定为 [critic, refiner]。
+    每一轮 Critic 与 Refiner 并发执行：Refiner 基于上一轮的 critique (第一轮为空) 投机地写出新稿，
+    Critic 同时审阅当前稿件。Critic 回复 approval_phrase 时丢弃投机稿件并结束循环，
+    否则提交投机稿件 (其事件交给 Runner 写入 Session，current_story 随之更新)。
+    每轮耗时从 L_critic + L_refiner 降到 max(L_critic, L_refiner)；
+    代价是 Refiner 使用的是上一轮的意见，而不是本轮的意见。
+
+    投机的 Refiner 运行在 Session 的私有副本上，被丢弃时不会在真实 Session 中留下任何事件，
+    也不会写入评审记忆 (update_memory 的写入在提交时才落盘)。
+    """
+
+    approval_phrase: str = "APPROVED"
+
+    @staticmethod
+    def _final_text(event: Event) -> Optional[str]:
+        if not event.is_final_response() or not event.content or not event.content.parts:
+            return None
+        return event.content.parts[0].text
+
+    @staticmethod
+    async def _draft(agent: BaseAgent, ctx: InvocationContext) -> tuple[list[Event], list[str]]:
+        """
+        Run the agent against a private copy of the session.
+        Return its buffered events and the memory tips it recorded (written only on commit).
+        """
+        draft_ctx = ctx.model_copy(update={"session": ctx.session.model_copy(deep=True)})
+        session = draft_ctx.session
+        events = []
+        # _draft 运行在独立的 Task 中，ContextVar 的修改只对本次投机执行可见
+        tips: list[str] = []
+        _pending_tips.set(tips)
+        async with aclosing(agent.run_async(draft_ctx)) as agen:
+            async for event in agen:
+                events.append(event)
+                # 模拟 SessionService.append_event，让 Refiner 的多步调用 (工具调用 -> 再次请求模型)
+                # 能看到自己之前的事件与状态变化
+                if event.partial:
+                    continue
+                if event.actions and event.actions.state_delta:
+                    for key, value in event.actions.state_delta.items():
+                        if not key.startswith("temp:"):
+                            session.state[key] = value
+                session.events.append(event)
+        return events, tips
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        if len(self.sub_agents) != 2:
+            raise ValueError(f"{self.name} expects exactly two sub-agents: [critic, refiner]")
+        critic, refiner = self.sub_agents
+
+        times_looped = 0
+        while not self.max_iterations or times_looped < self.max_iterations:
+            speculative = asyncio.create_task(self._draft(refiner, ctx))
+            try:
+                approved = False
+                should_exit = False
+                async with aclosing(critic.run_async(ctx)) as agen:
+                    async for event in agen:
+                        yield event
+                        text = self._final_text(event)
+                        if text and self.approval_phrase in text:
+                            approved = True
+                        if event.actions.escalate:
+                            should_exit = True
+
+                if approved:
+                    # 零 LLM 调用的退出路径：在 Python 中直接结束循环，而不是让 Refiner 再跑一轮去选择工具
+                    logger.info("🎯 Critic 已批准，丢弃第 %d 轮的投机稿件", times_looped + 1)
+                    return
+                if should_exit:
+                    return
+
+                # 提交投机稿件及其记录的写作要点
+                events, tips = await speculative
+                if tips:
+                    _save_memory(tips)
+                for event in events:
+                    yield event
+                    if event.actions.escalate:
+                        should_exit = True
+                if should_exit:
+                    return
+            finally:
+                if not speculative.done():
+                    speculative.cancel()
+            times_looped += 1
+
+# --- 5. 组装循环系统 (Loop System Architecture) ---
 
 def create_refinement_system() -> SequentialAgent:
     """
@@ -122,18 +299,18 @@ def create_refinement_system() -> SequentialAgent:
     [Initial Writer] -> [Loop: Critic -> Refiner]
     
     1. Initial Writer 先跑一次，生成初稿。
-    2. LoopAgent 开始运行：
-       - Critic 提意见
-       - Refiner 修改 (或决定退出)
-       - 如此往复，直到 Refiner 调用 exit_loop 或达到最大迭代次数。
+    2. SpeculativeLoopAgent 开始运行：
+       - Critic 提意见，同时 Refiner 基于上一轮意见投机地修改
+       - Critic 批准则丢弃投机稿件并退出，否则提交修改稿
+       - 如此往复，直到 Critic 批准 (在 Python 中直接结束循环) 或达到最大迭代次数。
     """
     logger.info("正在组装 Refinement System...")
     
     # 1. 定义循环体
-    refinement_loop = LoopAgent(
+    refinement_loop = SpeculativeLoopAgent(
         name="StoryRefinementLoop",
         sub_agents=[create_critic_agent(), create_refiner_agent()],
-        max_iterations=3 # 安全机制：防止死循环，最多修 3 次
+        max_iterations=2 # 安全机制：防止死循环；初稿已参考评审记忆，最多修 2 次
     )
     
     # 2. 串联：初稿 -> 循环修稿
@@ -142,7 +319,7 @@ def create_refinement_system() -> SequentialAgent:
         sub_agents=[create_initial_writer(), refinement_loop]
     )
 
-# --- 5. 运行逻辑 ---
+# --- 6. 运行逻辑 ---
 
 async def main():
     system = create_refinement_system()
@@ -160,7 +337,7 @@ async def main():
         print("="*50)
         
         # 提取最终结果逻辑需要适配 Loop 的输出结构
-        # 通常最后一步是 Refiner 的输出（如果是修改版）或 exit_loop 的结果
+        # 通常最后一步是 Refiner 的输出（如果是修改版）或 Critic 的 "APPROVED"
         # 我们这里简单打印最后一步的文本
         if isinstance(response, list) and response:
             last_step = response[-1]
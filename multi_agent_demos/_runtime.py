@@ -0,0 +1,39 @@
+"""
+多 Agent 演示脚本共用的运行时 (Shared Runtime)。
+
+InMemoryRunner 每次实例化都会新建 Session / Memory / Artifact 存储；
+这里改为进程内共享同一组 Service，在同一进程中依次运行多个演示时可以复用。
+"""
+from typing import Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.artifacts import InMemoryArtifactService
+from google.adk.runners import Runner
+
+from src.utils.sessions import get_memory_service, get_session_service
+
+_artifact_service: Optional[InMemoryArtifactService] = None
+
+
+def get_artifact_service() -> InMemoryArtifactService:
+    """Return the process-wide InMemoryArtifactService, creating it on first use."""
+    global _artifact_service
+    if _artifact_service is None:
+        _artifact_service = InMemoryArtifactService()
+    return _artifact_service
+
+
+def get_runner(root_agent: BaseAgent, app_name: Optional[str] = None) -> Runner:
+    """
+    InMemoryRunner 的替代品：Runner 绑定进程级共享的 Service。
+
+    app_name 默认使用 root_agent.name，保证不同演示的 Session (例如 run_debug
+    的默认 Session) 互相隔离，不会串用对话历史。
+    """
+    return Runner(
+        app_name=app_name or root_agent.name,
+        agent=root_agent,
+        artifact_service=get_artifact_service(),
+        session_service=get_session_service(),
+        memory_service=get_memory_service(),
+    )
@@ -1,14 +1,20 @@
+import asyncio
 import sys
 import os
 from typing import List
 
 # Ensure the root directory is in sys.path to allow importing config
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from google.adk.agents import LlmAgent
+from google.adk.agents.context_cache_config import ContextCacheConfig
+from google.adk.apps.app import App
 from google.adk.models.google_llm import Gemini
 from google.adk.tools.agent_tool import AgentTool
 from google.adk.tools.google_search_tool import google_search
+from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 
 from config import settings
@@ -19,7 +25,8 @@ logger = settings.setup_logging("research_agent")
 # 2. 配置重试策略
 retry_config = types.HttpRetryOptions(
     attempts=5,
-    exp_base=7,
+    exp_base=2,
+    max_delay=16,
     initial_delay=1,
     http_status_codes=[429, 500, 503, 504],
 )
@@ -40,11 +47,12 @@ def count_papers(papers: List[str]):
     Returns:
       The number of papers in the list.
     """
-    logger.debug(f"Tool 'count_papers' called. Input type: {type(papers)}")
-    logger.debug(f"Input value snippet: {str(papers)[:100]}...")
+    # %-style 参数在日志级别未开启时不会被格式化：长列表不会每次调用都被 str() 整体序列化
+    logger.debug("Tool 'count_papers' called. Input type: %s", type(papers))
+    logger.debug("Input value snippet: %.100s...", papers)
     
     count = len(papers)
-    logger.info(f"Tool 'count_papers' returning count: {count}")
+    logger.info("Tool 'count_papers' returning count: %d", count)
     return count
 
 
@@ -64,6 +72,35 @@ google_search_agent = LlmAgent(
 )
 
 
+# 搜索子 Agent 封装为工具 (root_agent 与 search_topics 共用同一个实例)
+google_search_tool = AgentTool(agent=google_search_agent)
+
+async def search_topics(topics: List[str], tool_context: ToolContext) -> dict:
+    """
+    Searches for research papers on several topics at once.
+
+    Args:
+      topics: A list of research topics to search for.
+
+    Returns:
+      A dictionary mapping each topic to its search results.
+    """
+    # 各主题的搜索互不依赖，并发执行：耗时从 sum(L_i) 降到 max(L_i)
+    unique_topics = list(dict.fromkeys(topics))
+    logger.info("Tool 'search_topics' searching %d topics concurrently", len(unique_topics))
+    results = await asyncio.gather(
+        *(
+            google_search_tool.run_async(args={"request": topic}, tool_context=tool_context)
+            for topic in unique_topics
+        ),
+        return_exceptions=True,
+    )
+    return {
+        topic: f"Error: {result}" if isinstance(result, Exception) else result
+        for topic, result in zip(unique_topics, results)
+    }
+
+
 # 5. 定义 Root Agent
 # 负责协调搜索和计数
 root_agent = LlmAgent(
@@ -77,10 +114,28 @@ root_agent = LlmAgent(
 
     You MUST ALWAYS follow these steps:
     1) Find research papers on the user provided topic using the 'google_search_agent'. 
+       If the user provides several topics, call 'search_topics' once with all of them instead.
     2) Then, pass the papers to 'count_papers' tool to count the number of papers returned.
     3) Return both the list of research papers and the total number of papers.
     """,
-    tools=[AgentTool(agent=google_search_agent), count_papers]
+    tools=[google_search_tool, search_topics, count_papers]
+)
+
+# 6. 定义 App (开启上下文缓存)
+# instruction 与工具声明在每次请求中都原样重复发送。开启 ADK 的上下文缓存后，这段静态前缀由
+# Gemini 显式缓存 (CachedContent) 并按句柄引用；缓存到期或复用 cache_intervals 次后由 ADK 自动重建。
+# 请求低于 min_tokens 时不创建缓存 (Gemini 显式缓存有最小 token 数要求，过小的请求缓存反而更贵)。
+CACHE_TTL_SECONDS = 3600
+CACHE_MIN_TOKENS = 2048
+
+app = App(
+    name="research_agent",
+    root_agent=root_agent,
+    context_cache_config=ContextCacheConfig(
+        ttl_seconds=CACHE_TTL_SECONDS,
+        cache_intervals=10,
+        min_tokens=CACHE_MIN_TOKENS,
+    ),
 )
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import asyncio
+import secrets
+import sys
+import os
+from typing import List
+
+# Ensure the root directory is in sys.path to allow importing config
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from google import genai
+from google.adk.runners import Runner
+from google.genai import types
+
+from config import settings
+from research_agent.agent import google_search_agent
+from src.utils.loop import run_main
+from src.utils.sessions import get_session_service, run_batch_async
+
+# 1. 配置日志
+logger = settings.setup_logging("research_agent.batch")
+
+# 2. 批量参数 (Batch Configuration)
+APP_NAME = "research_batch"
+USER_ID = "batch_user"
+MAX_CONCURRENCY = 8          # 回退路径的最大并发数
+POLL_INITIAL_DELAY = 5.0     # Batch 任务轮询间隔 (秒)，指数退避
+POLL_MAX_DELAY = 60.0
+BATCH_TIMEOUT = 3600.0       # 超过该时间仍未完成则取消任务并回退
+
+
+def _search_prompt(topic: str) -> str:
+    return f"Find recent papers on {topic}"
+
+
+# 3. Gemini Batch API 路径
+# 每个主题一条 inlined request：与 google_search_agent 相同的指令与 google_search 工具，
+# 一次提交、统一轮询，按 Batch 价格计费 (约为在线调用的一半)
+async def _research_batch_api(topics: List[str], timeout: float) -> dict[str, str]:
+    client = genai.Client(api_key=settings.get_api_key())
+    config = types.GenerateContentConfig(
+        system_instruction=google_search_agent.instruction,
+        tools=[types.Tool(google_search=types.GoogleSearch())],
+    )
+    job = await client.aio.batches.create(
+        model=settings.DEFAULT_MODEL_NAME,
+        src=[types.InlinedRequest(contents=_search_prompt(topic), config=config) for topic in topics],
+        config=types.CreateBatchJobConfig(display_name=f"{APP_NAME}-{len(topics)}-topics"),
+    )
+    logger.info("Batch job %s submitted with %d topics", job.name, len(topics))
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = POLL_INITIAL_DELAY
+    while not job.done:
+        if loop.time() >= deadline:
+            await client.aio.batches.cancel(name=job.name)
+            raise TimeoutError(f"Batch job {job.name} did not finish within {timeout:.0f}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, POLL_MAX_DELAY)
+        job = await client.aio.batches.get(name=job.name)
+
+    if job.state != types.JobState.JOB_STATE_SUCCEEDED:
+        raise RuntimeError(f"Batch job {job.name} ended in state {job.state}: {job.error}")
+
+    results = {}
+    for topic, inlined in zip(topics, job.dest.inlined_responses):
+        if inlined.error is not None:
+            results[topic] = f"Error: {inlined.error.message}"
+        else:
+            results[topic] = inlined.response.text or ""
+    return results
+
+
+# 4. 回退路径：并发执行 google_search_agent (每个主题一个独立 Session)
+async def _research_concurrent(topics: List[str], max_concurrency: int) -> dict[str, str]:
+    runner = Runner(
+        agent=google_search_agent,
+        app_name=APP_NAME,
+        session_service=get_session_service(),
+    )
+    batch_id = secrets.token_hex(4)
+    results = await run_batch_async(
+        runner,
+        USER_ID,
+        [_search_prompt(topic) for topic in topics],
+        [f"{batch_id}-{i}" for i in range(len(topics))],
+        max_concurrency=max_concurrency,
+    )
+    return {
+        topic: f"Error: {result}" if isinstance(result, BaseException) else "\n".join(result)
+        for topic, result in zip(topics, results)
+    }
+
+
+async def research_batch(
+    topics: List[str],
+    use_batch_api: bool = True,
+    max_concurrency: int = MAX_CONCURRENCY,
+    timeout: float = BATCH_TIMEOUT,
+) -> dict[str, str]:
+    """
+    Searches for research papers on many topics at once (dataset-scale evaluation runs).
+
+    Args:
+      topics: The research topics to search for. Duplicates are searched once.
+      use_batch_api: Submit all searches as one Gemini Batch API job first.
+      max_concurrency: Concurrency limit for the fallback path.
+      timeout: Seconds to wait for the batch job before falling back.
+
+    Returns:
+      A dictionary mapping each topic to its search results.
+    """
+    unique_topics = list(dict.fromkeys(topics))
+    if not unique_topics:
+        return {}
+
+    if use_batch_api:
+        try:
+            return await _research_batch_api(unique_topics, timeout)
+        except Exception as e:
+            # 模型不支持 Batch、配额不足或超时：回退到并发的在线调用
+            logger.warning("Batch API unavailable (%s), falling back to concurrent search", e)
+
+    logger.info("Searching %d topics concurrently (max %d)", len(unique_topics), max_concurrency)
+    return await _research_concurrent(unique_topics, max_concurrency)
+
+
+async def main():
+    topics = ["quantum computing", "protein folding", "retrieval-augmented generation"]
+    results = await research_batch(topics)
+    for topic, result in results.items():
+        print(f"\n📚 {topic}\n{result}")
+
+
+if __name__ == "__main__":
+    run_main(main())
@@ -3,12 +3,14 @@ import sys
 import os
 
 # Ensure root directory is in sys.path
-sys.path.append(os.path.dirname(__file__))
+ROOT_DIR = os.path.abspath(os.path.dirname(__file__))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from google.adk.runners import InMemoryRunner
-from google.adk.plugins.logging_plugin import LoggingPlugin
+from src.plugins.queued_logging_plugin import QueuedLoggingPlugin
 from src.plugins.telemetry_plugin import TelemetryPlugin  # <--- Import custom plugin
-from research_agent.agent import root_agent
+from research_agent.agent import app
 from config import settings
 
 # 配置日志
@@ -23,12 +25,16 @@ async def main():
     # 初始化 Runner
     # 关键点：我们将 LoggingPlugin 注入到 Runner 中
     # 这会自动捕获所有的 Agent 交互、工具调用和 LLM 请求
+    # QueuedLoggingPlugin 与 LoggingPlugin 输出相同，但经由后台日志线程写出，不阻塞事件循环
+    # 传入 App (而不是裸的 root_agent) 以沿用 research_agent 的上下文缓存配置；
+    # 使用 App 时插件需要挂在 App 上
     runner = InMemoryRunner(
-        agent=root_agent,
-        plugins=[
-            LoggingPlugin(),
-            telemetry  # <--- Add custom plugin
-        ]
+        app=app.model_copy(update={
+            "plugins": [
+                QueuedLoggingPlugin(),
+                telemetry  # <--- Add custom plugin
+            ]
+        })
     )
 
     query = "Find recent papers on quantum computing"
@@ -1,21 +1,22 @@
 import asyncio
+import io
 import logging
 import sys
-import os
 
-# Ensure the root directory is in sys.path to allow importing config
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-from typing import Any, Dict
+from functools import lru_cache
+from typing import Any, Dict, Optional, TextIO
 from google.adk.agents import Agent, LlmAgent
 from google.adk.apps.app import App, EventsCompactionConfig
 from google.adk.models.google_llm import Gemini
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService, DatabaseSessionService
+from google.adk.sessions import InMemorySessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
 
 from config import settings
+from src.utils.sessions import get_or_create_session, run_batch_async, run_query
+from src.utils.loop import run_main
 
 # --- 1. 配置日志 (Logging Configuration) ---
 logger = settings.setup_logging("session_demo_agent")
@@ -23,56 +24,99 @@ logger = settings.setup_logging("session_demo_agent")
 # --- 2. 配置重试策略 (Retry Configuration) ---
 retry_config = types.HttpRetryOptions(
     attempts=5,
-    exp_base=7,
+    exp_base=2,
+    max_delay=16,
     initial_delay=1,
     http_status_codes=[429, 500, 503, 504],
 )
 
+@lru_cache(maxsize=1)
+def create_model() -> Gemini:
+    """
+    所有 Agent (各个 Phase) 共享同一个 Gemini 实例，
+    复用底层 HTTP 客户端与连接池，避免每个 Agent 重复初始化。
+    """
+    return Gemini(
+        model=settings.DEFAULT_MODEL_NAME,
+        api_key=settings.get_api_key(),
+        retry_options=retry_config
+    )
+
 # --- 3. 定义常量 (Constants) ---
 APP_NAME = "SessionDemoApp"
 USER_ID = "demo_user"
 
+# 只读取 Session state 时使用 (num_recent_events=0 表示不限制，因此取 1)
+STATE_ONLY_CONFIG = GetSessionConfig(num_recent_events=1)
+
 async def run_session(
     runner_instance: Runner, 
     session_service: InMemorySessionService,
     user_queries: list[str] | str, 
-    session_id: str = "default"
+    session_id: str = "default",
+    concurrent: bool = False,
+    out: Optional[TextIO] = None,
 ):
     """
     Helper function to run queries in a session and display responses.
     Ref: Tutorial Section 1.4
+
+    concurrent=True 时，多个互相独立的查询会并发执行 (最多 settings.MAX_CONCURRENT_QUERIES 个)：
+    每个查询使用独立的 Session (f"{session_id}-{i}")，输出按查询顺序在全部完成后打印。
+    默认按顺序在同一个 Session 中执行，保留多轮对话上下文。
+
+    out 默认为 sys.stdout；并发运行多个 run_session 时可传入各自的 StringIO，由调用方按顺序输出。
     """
-    logger.info(f"--- Starting Session: {session_id} ---")
+    logger.info("--- Starting Session: %s ---", session_id)
 
-    # Create or retrieve session
+    if isinstance(user_queries, str):
+        user_queries = [user_queries]
+
+    # 输出先写入 StringIO，结束时一次性写到 stdout (每个 Session 只 flush 一次)
+    buf = io.StringIO()
     try:
-        session = await session_service.create_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
-        )
-        logger.debug(f"Created new session: {session_id}")
-    except Exception:
-        # If session exists, get it
-        session = await session_service.get_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
+        if not concurrent or len(user_queries) == 1:
+            # Create or retrieve session
+            session = await get_or_create_session(session_service, APP_NAME, USER_ID, session_id)
+            await _run_queries(runner_instance, session.id, user_queries, buf)
+            return
+
+        results = await run_batch_async(
+            runner_instance,
+            USER_ID,
+            user_queries,
+            [f"{session_id}-{i}" for i in range(len(user_queries))],
+            max_concurrency=settings.MAX_CONCURRENT_QUERIES,
         )
-        logger.debug(f"Retrieved existing session: {session_id}")
 
-    if isinstance(user_queries, str):
-        user_queries = [user_queries]
+        # 按查询顺序输出，保证演示结果确定
+        for query, result in zip(user_queries, results):
+            _write_result(buf, query, result)
+    finally:
+        out = out or sys.stdout
+        out.write(buf.getvalue())
+        out.flush()
 
+async def _run_queries(
+    runner_instance: Runner,
+    session_id: str,
+    user_queries: list[str],
+    buf: io.StringIO,
+) -> None:
+    # 用户消息由 run_query 通过 make_user_msg 构建 (按文本缓存)，重复的查询不会重新构造 Content；
+    # 需要分批并发时走 run_batch_async (Semaphore 限流)，这里保持同一 Session 的顺序执行
     for query in user_queries:
-        print(f"\nUser > {query}")
-        query_content = types.Content(role="user", parts=[types.Part(text=query)])
+        _write_result(buf, query, await run_query(runner_instance, USER_ID, session_id, query))
 
-        # Stream agent response
-        async for event in runner_instance.run_async(
-            user_id=USER_ID, session_id=session.id, new_message=query_content
-        ):
-            if event.is_final_response() and event.content and event.content.parts:
-                text = event.content.parts[0].text
-                if text and text != "None":
-                    print(f"Model > {text}")
-                    logger.info(f"Model Response: {text[:50]}...")
+def _write_result(buf: io.StringIO, query: str, result: list[str] | BaseException) -> None:
+    buf.write(f"\nUser > {query}\n")
+    if isinstance(result, BaseException):
+        buf.write(f"❌ Error: {result}\n")
+        logger.error("Query failed: %s", result)
+        return
+    for text in result:
+        buf.write(f"Model > {text}\n")
+        logger.info("Model Response: %.50s...", text)
 
 async def run_phase_1():
     """
@@ -88,11 +132,7 @@ async def run_phase_1():
     # --- Step 2: Create Agent ---
     # 使用基础 Agent，无需特殊工具
     simple_agent = Agent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
+        model=create_model(),
         name="SessionBot",
         description="A simple chatbot to demonstrate sessions.",
     )
@@ -109,18 +149,16 @@ async def run_phase_1():
     # --- Step 4: Test Stateful Conversation ---
     # 在同一个 Session 中连续提问，验证上下文保持
     session_id = "session-01"
-    print(f"\n📝 [Conversation 1] Testing Context Retention (Session ID: {session_id})")
+    conversation_1 = io.StringIO()
+    conversation_1.write(f"\n📝 [Conversation 1] Testing Context Retention (Session ID: {session_id})\n")
     
     queries = [
         "Hi, I am Sam! What is the capital of United States?",
         "Hello! What is my name?"  # Agent 应该能记住上一句提到的名字
     ]
-    
-    await run_session(runner, session_service, queries, session_id)
 
     # --- Step 5: Verify Forgetfulness (Optional Simulation) ---
     # 模拟重启：创建一个新的 Runner 和 SessionService (相当于重启 App)
-    print("\n🔄 [Simulation] Restarting Application (Simulated)...")
     new_session_service = InMemorySessionService()
     new_runner = Runner(
         agent=simple_agent,
@@ -129,13 +167,23 @@ async def run_phase_1():
     )
     
     # 尝试使用相同的 Session ID 提问
-    print(f"\n📝 [Conversation 2] Testing Data Loss after Restart (Session ID: {session_id})")
-    await run_session(
-        new_runner, 
-        new_session_service, 
-        "What is my name?", # Agent 应该已经忘记了
-        session_id
+    conversation_2 = io.StringIO()
+    conversation_2.write("\n🔄 [Simulation] Restarting Application (Simulated)...\n")
+    conversation_2.write(f"\n📝 [Conversation 2] Testing Data Loss after Restart (Session ID: {session_id})\n")
+
+    # Conversation 2 使用全新的 SessionService，与 Conversation 1 没有任何数据依赖，
+    # 两者并发执行 (耗时从 3 次往返降到 2 次)；输出仍按演示顺序打印
+    await asyncio.gather(
+        run_session(runner, session_service, queries, session_id, out=conversation_1),
+        run_session(
+            new_runner, 
+            new_session_service, 
+            "What is my name?", # Agent 应该已经忘记了
+            session_id,
+            out=conversation_2,
+        ),
     )
+    sys.stdout.write(conversation_1.getvalue() + conversation_2.getvalue())
 
 async def run_phase_2():
     """
@@ -146,17 +194,16 @@ async def run_phase_2():
     # --- Step 1: Initialize Database Service ---
     # 使用 SQLite 进行持久化存储
     # 注意：SQLAlchemy 的 asyncio 扩展需要使用 aiosqlite 驱动
+    # DatabaseSessionService 与 SQLAlchemy 只在本阶段需要，按需导入 (main() 默认只运行 Phase 3)
+    from session_demo_agent.db import create_db_session_service
+
     db_url = "sqlite+aiosqlite:///my_agent_data.db"
-    session_service = DatabaseSessionService(db_url=db_url)
-    logger.info(f"✅ Service initialized: DatabaseSessionService ({db_url})")
+    session_service = create_db_session_service(db_url)
+    logger.info("✅ Service initialized: DatabaseSessionService (%s)", db_url)
     
     # --- Step 2: Create Agent & Runner ---
     persistent_agent = LlmAgent(
-        model=Gemini(
-            model=settings.DEFAULT_MODEL_NAME,
-            api_key=settings.get_api_key(),
-            retry_options=retry_config
-        ),
+        model=create_model(),
         name="PersistentBot",
         description="A chatbot with persistent memory.",
     )
@@ -181,31 +228,33 @@ async def run_phase_2():
     print("\n🔄 [Simulation] Restarting Application (Re-initializing Service)...")
     # 重新初始化 Service，模拟 App 重启
     # 因为连接的是同一个 SQLite 文件，数据应该还在
-    restarted_session_service = DatabaseSessionService(db_url=db_url)
+    restarted_session_service = create_db_session_service(db_url)
     restarted_runner = Runner(
         agent=persistent_agent,
         app_name=APP_NAME,
         session_service=restarted_session_service
     )
     
-    print(f"\n📝 [Conversation 2] Testing Persistence after Restart (Session ID: {session_id})")
-    await run_session(
-        restarted_runner, 
-        restarted_session_service, 
-        "What is my name?", # Agent 应该还能记住 "Sam"
-        session_id
-    )
-    
-    # --- Step 5: Verify Isolation ---
-    # 使用一个新的 Session ID，验证数据隔离
+    # --- Step 5: Verify Persistence & Isolation ---
+    # Conversation 2 (同一个 Session，应该还记得 "Sam") 与 Conversation 3 (新的 Session ID，应该不知道名字)
+    # 都只依赖 Conversation 1 已写入数据库，彼此独立，因此作为一个批次并发执行
     new_session_id = "db-session-02"
-    print(f"\n📝 [Conversation 3] Testing Session Isolation (Session ID: {new_session_id})")
-    await run_session(
-        restarted_runner, 
-        restarted_session_service, 
-        "What is my name?", # Agent 应该不知道名字
-        new_session_id
+    conversations = [
+        ("Conversation 2", "Testing Persistence after Restart", session_id),
+        ("Conversation 3", "Testing Session Isolation", new_session_id),
+    ]
+    results = await run_batch_async(
+        restarted_runner,
+        USER_ID,
+        ["What is my name?"] * len(conversations),
+        [sid for _, _, sid in conversations],
+        max_concurrency=settings.MAX_CONCURRENT_QUERIES,
     )
+    buf = io.StringIO()
+    for (label, title, sid), result in zip(conversations, results):
+        buf.write(f"\n📝 [{label}] {title} (Session ID: {sid})\n")
+        _write_result(buf, "What is my name?", result)
+    sys.stdout.write(buf.getvalue())
 
 # --- Phase 3 Tools ---
 def save_userinfo(tool_context: ToolContext, user_name: str, country: str) -> Dict[str, Any]:
@@ -215,7 +264,7 @@ def save_userinfo(tool_context: ToolContext, user_name: str, country: str) -> Di
     # Write to session state using the 'user:' prefix for user data
     tool_context.state["user:name"] = user_name
     tool_context.state["user:country"] = country
-    logger.info(f"💾 [Tool] Saved user info to state: {user_name}, {country}")
+    logger.info("💾 [Tool] Saved user info to state: %s, %s", user_name, country)
     return {"status": "success"}
 
 def retrieve_userinfo(tool_context: ToolContext) -> Dict[str, Any]:
@@ -225,7 +274,7 @@ def retrieve_userinfo(tool_context: ToolContext) -> Dict[str, Any]:
     # Read from session state
     user_name = tool_context.state.get("user:name", "Username not found")
     country = tool_context.state.get("user:country", "Country not found")
-    logger.info(f"🔍 [Tool] Retrieved user info from state: {user_name}, {country}")
+    logger.info("🔍 [Tool] Retrieved user info from state: %s, %s", user_name, country)
     return {"status": "success", "user_name": user_name, "country": country}
 
 async def run_phase_3():
@@ -239,7 +288,7 @@ async def run_phase_3():
     
     # 1. Define Agent
     compaction_agent = LlmAgent(
-        model=Gemini(model=settings.DEFAULT_MODEL_NAME, api_key=settings.get_api_key()),
+        model=create_model(),
         name="CompactionBot",
         description="A bot that summarizes old conversations."
     )
@@ -289,15 +338,9 @@ async def run_phase_3():
         # 因为 run_session 耦合了 APP_NAME 常量
         
         print(f"User > {q}")
-        query_content = types.Content(role="user", parts=[types.Part(text=q)])
-        async for event in runner.run_async(
-            user_id=USER_ID, session_id=session_id, new_message=query_content
-        ):
-            if event.is_final_response() and event.content and event.content.parts:
-                text = event.content.parts[0].text
-                if text and text != "None":
-                    print(f"Model > {text}")
-                    logger.info(f"Model Response: {text[:50]}...")
+        for text in await run_query(runner, USER_ID, session_id, q):
+            print(f"Model > {text}")
+            logger.info("Model Response: %.50s...", text)
         
     # 5. Verify Compaction
     print("\n🔍 Verifying Compaction Event in Session History...")
@@ -307,15 +350,15 @@ async def run_phase_3():
         user_id=USER_ID, 
         session_id=session_id
     )
-    found_summary = False
-    for event in final_session.events:
-        if event.actions and event.actions.compaction:
-            print("✅ SUCCESS! Found Compaction Event:")
-            print(f"   Summary: {str(event)[:100]}...")
-            found_summary = True
-            break
-            
-    if not found_summary:
+    # 压缩事件追加在历史末尾附近，从后往前找，找到即停
+    summary_event = next(
+        (e for e in reversed(final_session.events) if e.actions and e.actions.compaction),
+        None,
+    )
+    if summary_event is not None:
+        print("✅ SUCCESS! Found Compaction Event:")
+        print(f"   Summary: {str(summary_event)[:100]}...")
+    else:
         print("❌ No compaction event found.")
 
     # --- Part B: Session State ---
@@ -323,7 +366,7 @@ async def run_phase_3():
     
     # 1. Agent with State Tools
     state_agent = LlmAgent(
-        model=Gemini(model=settings.DEFAULT_MODEL_NAME, api_key=settings.get_api_key()),
+        model=create_model(),
         name="StateBot",
         description="A bot that remembers user info using session state.",
         tools=[save_userinfo, retrieve_userinfo]
@@ -356,10 +399,12 @@ async def run_phase_3():
     )
     
     # 3. Inspect State Directly
+    # 只需要 state：最多加载最近 1 条事件，不复制 / 读取整段对话历史
     session = await state_runner.session_service.get_session(
         app_name=APP_NAME, 
         user_id=USER_ID, 
-        session_id=state_session_id
+        session_id=state_session_id,
+        config=STATE_ONLY_CONFIG,
     )
     print(f"\n🔍 Direct State Inspection: {session.state}")
 
@@ -369,4 +414,4 @@ async def main():
     await run_phase_3()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run_main(main())
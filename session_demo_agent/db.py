@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any
+
+from google.adk.sessions import DatabaseSessionService
+from sqlalchemy import event
+
+# SQLite 连接参数：WAL + synchronous=NORMAL，每次写入不再等待完整 fsync (WAL 文件在重启后自动恢复)
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",  # 负数单位为 KiB：64 MB 页缓存 (默认约 2 MB)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # 256 MB
+)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+# 同一个数据库文件的写入在进程内串行 (phase 2 的原服务与“重启”后的服务指向同一个文件，共用一把锁)
+_sqlite_write_locks: dict[str, asyncio.Lock] = {}
+
+class SerializedWriteSessionService(DatabaseSessionService):
+    """
+    SQLite 只允许一个写者：并发的 create_session / append_event 会在数据库锁上互相等待，
+    超时后抛出 "database is locked"。这里在进程内用 asyncio.Lock 串行化写操作，
+    读操作 (get_session / list_sessions) 不加锁，借助 WAL 与写入并发执行。
+
+    不需要再用 run_in_executor 把提交挪出事件循环：aiosqlite 的每个连接都在自己的后台线程里
+    执行 SQLite 调用 (包括 COMMIT 与 fsync)，事件循环只等待结果；写锁保证同一时刻只有一个写者，
+    效果等同于单线程的写入执行器。
+    """
+
+    def __init__(self, db_url: str, **kwargs: Any):
+        super().__init__(db_url=db_url, **kwargs)
+        self._write_lock = _sqlite_write_locks.setdefault(db_url, asyncio.Lock())
+
+    async def create_session(self, *args, **kwargs):
+        async with self._write_lock:
+            return await super().create_session(*args, **kwargs)
+
+    async def delete_session(self, *args, **kwargs):
+        async with self._write_lock:
+            return await super().delete_session(*args, **kwargs)
+
+    async def append_event(self, session, event):
+        async with self._write_lock:
+            return await super().append_event(session, event)
+
+def create_db_session_service(db_url: str) -> DatabaseSessionService:
+    """
+    DatabaseSessionService with a pooled engine; SQLite connections are switched to WAL mode
+    and writes are serialized in-process.
+    """
+    session_service = SerializedWriteSessionService(
+        db_url=db_url,
+        connect_args={"timeout": 30},  # 写锁等待时间 (秒)
+        pool_size=10,
+        max_overflow=20,
+    )
+    engine = session_service.db_engine
+    if engine.dialect.name == "sqlite":
+        # 每个新建的连接都设置一次 (与 ADK 自身开启 foreign_keys 的方式相同)
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return session_service
@@ -13,7 +13,9 @@ try:
     from config.settings import get_api_key, setup_logging, DEFAULT_MODEL_NAME
 except ImportError:
     import sys
-    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
     from config.settings import get_api_key, setup_logging, DEFAULT_MODEL_NAME
 
 from .tools import place_shipping_order
@@ -25,7 +27,7 @@ logger = setup_logging("shipping_agent")
 try:
     os.environ["GOOGLE_API_KEY"] = get_api_key()
 except Exception as e:
-    logger.error(f"Failed to set API Key: {e}")
+    logger.error("Failed to set API Key: %s", e)
 
 # --- 1. Create Agent ---
 shipping_agent = LlmAgent(
@@ -19,7 +19,7 @@ def place_shipping_order(
     Returns:
         Dictionary with order status
     """
-    logger.info(f"📦 Tool called: place_shipping_order(num={num_containers}, dest={destination})")
+    logger.info("📦 Tool called: place_shipping_order(num=%s, dest=%s)", num_containers, destination)
 
     # -----------------------------------------------------------------------------------------------
     # SCENARIO 1: Small orders (<=5 containers) auto-approve
@@ -39,7 +39,7 @@ def place_shipping_order(
     # -----------------------------------------------------------------------------------------------
     # tool_context.tool_confirmation is None on the first run
     if not tool_context.tool_confirmation:
-        logger.warning(f"⚠️ Large order detected ({num_containers} > {LARGE_ORDER_THRESHOLD}). Requesting approval...")
+        logger.warning("⚠️ Large order detected (%s > %s). Requesting approval...", num_containers, LARGE_ORDER_THRESHOLD)
         
         # Request confirmation from the system/user
         tool_context.request_confirmation(
@@ -1,33 +1,42 @@
 import asyncio
-import uuid
+import io
+import sys
+import secrets
 import logging
 from google.genai import types
 
 # Import from local modules
 from .agent import shipping_runner, session_service
+from src.utils.sessions import consume_stream
 
 logger = logging.getLogger("shipping_agent.workflow")
 
 # --- Helper Functions ---
 
-def check_for_approval(events):
+def check_for_approval(event):
     """
-    检查事件流中是否包含 'adk_request_confirmation' 事件。
+    检查单个事件是否包含 'adk_request_confirmation' 调用。
     如果存在，说明 Agent 请求暂停并等待审批。
+
+    在事件流的 async for 中逐个调用，无需先把全部事件收集到列表再扫描；
+    确认请求通常是事件中的最后一个 function_call，因此从后往前查找。
     """
-    for event in events:
-        if event.content and event.content.parts:
-            for part in event.content.parts:
-                if (
-                    part.function_call
-                    and part.function_call.name == "adk_request_confirmation"
-                ):
-                    return {
-                        "approval_id": part.function_call.id,
-                        "invocation_id": event.invocation_id, # 关键：用于恢复执行的 ID
-                        "args": part.function_call.args
-                    }
-    return None
+    if not event.content or not event.content.parts:
+        return None
+    part = next(
+        (
+            p for p in reversed(event.content.parts)
+            if p.function_call and p.function_call.name == "adk_request_confirmation"
+        ),
+        None,
+    )
+    if part is None:
+        return None
+    return {
+        "approval_id": part.function_call.id,
+        "invocation_id": event.invocation_id, # 关键：用于恢复执行的 ID
+        "args": part.function_call.args
+    }
 
 def create_approval_response(approval_info, approved: bool):
     """
@@ -42,86 +51,107 @@ def create_approval_response(approval_info, approved: bool):
         role="user", parts=[types.Part(function_response=confirmation_response)]
     )
 
-def print_agent_response(events):
-    """打印 Agent 的文本回复"""
-    for event in events:
-        if event.content and event.content.parts:
-            for part in event.content.parts:
-                if part.text:
-                    print(f"🤖 Agent > {part.text}")
+def emit_agent_text(event, emit):
+    """
+    输出单个事件中 Agent 的文本回复。
+    同一事件的多个文本 Part 先拼接，再一次性交给 emit，而不是逐个 Part 输出。
+    """
+    if not event.content or not event.content.parts:
+        return
+    texts = [part.text for part in event.content.parts if part.text]
+    if texts:
+        emit(f"🤖 Agent > {''.join(texts)}")
 
 # --- Main Workflow Logic ---
 
 async def run_shipping_workflow(query: str, auto_approve: bool = True):
     """
     运行完整的航运审批工作流。
+    输出先写入 StringIO，结束时一次性写到 stdout：多个工作流并发运行时各自的输出不会交错。
     """
-    print(f"\n{'='*60}")
-    print(f"👤 User > {query}")
+    buf = io.StringIO()
+
+    def emit(line: str) -> None:
+        buf.write(line + "\n")
+
+    try:
+        await _run_shipping_workflow(query, auto_approve, emit)
+    finally:
+        # 单次同步写入，中间没有 await，不会与其他协程的输出交错
+        sys.stdout.write(buf.getvalue())
+        sys.stdout.flush()
+
+async def _run_shipping_workflow(query: str, auto_approve: bool, emit):
+    emit(f"\n{'='*60}")
+    emit(f"👤 User > {query}")
     
     # 1. 创建新会话
-    session_id = f"order_{uuid.uuid4().hex[:8]}"
+    session_id = f"order_{secrets.token_hex(4)}"
     await session_service.create_session(
         app_name="shipping_coordinator", user_id="test_user", session_id=session_id
     )
     
     query_content = types.Content(role="user", parts=[types.Part(text=query)])
-    events = []
+    approval_info = None
 
-    # 2. 第一阶段执行：发送用户请求
-    logger.info("▶️ Starting execution...")
-    async for event in shipping_runner.run_async(
-        user_id="test_user", session_id=session_id, new_message=query_content
-    ):
-        events.append(event)
+    def on_event(event):
+        nonlocal approval_info
         # 实时打印回复
-        if event.content and event.content.parts:
-            for part in event.content.parts:
-                if part.text:
-                    print(f"🤖 Agent > {part.text}")
+        emit_agent_text(event, emit)
+        # 3. 边接收边检查是否暂停 (不保留事件列表)；
+        # consume_stream 不会提前 break，Runner 会完成本次调用的收尾 (保存可恢复状态)
+        if approval_info is None:
+            approval_info = check_for_approval(event)
 
-    # 3. 检查是否暂停
-    approval_info = check_for_approval(events)
+    # 2. 第一阶段执行：发送用户请求
+    logger.info("▶️ Starting execution...")
+    await consume_stream(
+        shipping_runner.run_async(
+            user_id="test_user", session_id=session_id, new_message=query_content
+        ),
+        on_event,
+    )
 
     if approval_info:
         # --- 暂停状态 ---
-        print(f"\n⏸️  Workflow PAUSED for approval.")
-        print(f"   Details: {approval_info.get('args')}")
+        emit(f"\n⏸️  Workflow PAUSED for approval.")
+        emit(f"   Details: {approval_info.get('args')}")
         
         # 模拟人工决策
         decision = "APPROVE ✅" if auto_approve else "REJECT ❌"
-        print(f"🤔 Human Decision: {decision}\n")
+        emit(f"🤔 Human Decision: {decision}\n")
 
         # 4. 第二阶段执行：恢复 (Resume)
         # 使用相同的 session_id 和之前保存的 invocation_id
-        logger.info(f"▶️ Resuming execution with invocation_id={approval_info['invocation_id']}...")
+        logger.info("▶️ Resuming execution with invocation_id=%s...", approval_info["invocation_id"])
         
         resume_message = create_approval_response(approval_info, auto_approve)
         
-        async for event in shipping_runner.run_async(
-            user_id="test_user",
-            session_id=session_id,
-            new_message=resume_message, # 传入审批结果
-            invocation_id=approval_info["invocation_id"], # 告诉 ADK 这是一个恢复操作
-        ):
-            if event.content and event.content.parts:
-                for part in event.content.parts:
-                    if part.text:
-                        print(f"🤖 Agent > {part.text}")
+        await consume_stream(
+            shipping_runner.run_async(
+                user_id="test_user",
+                session_id=session_id,
+                new_message=resume_message, # 传入审批结果
+                invocation_id=approval_info["invocation_id"], # 告诉 ADK 这是一个恢复操作
+            ),
+            lambda event: emit_agent_text(event, emit),
+        )
     else:
         logger.info("✅ Workflow completed without interruption.")
 
-    print(f"{'='*60}\n")
+    emit(f"{'='*60}\n")
 
 async def main():
-    # Demo 1: 小订单 (自动通过)
-    await run_shipping_workflow("Ship 3 containers to Singapore")
-
-    # Demo 2: 大订单 (模拟人工批准)
-    await run_shipping_workflow("Ship 10 containers to Rotterdam", auto_approve=True)
-
-    # Demo 3: 大订单 (模拟人工拒绝)
-    await run_shipping_workflow("Ship 8 containers to Los Angeles", auto_approve=False)
+    # 三个演示使用各自独立的 Session，互不依赖，并发执行；
+    # 每个工作流的输出在其结束时整体打印 (先完成的先打印)
+    await asyncio.gather(
+        # Demo 1: 小订单 (自动通过)
+        run_shipping_workflow("Ship 3 containers to Singapore"),
+        # Demo 2: 大订单 (模拟人工批准)
+        run_shipping_workflow("Ship 10 containers to Rotterdam", auto_approve=True),
+        # Demo 3: 大订单 (模拟人工拒绝)
+        run_shipping_workflow("Ship 8 containers to Los Angeles", auto_approve=False),
+    )
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,59 +1,99 @@
 import asyncio
 import sys
 import os
-import uuid
-import aiohttp
+import secrets
+from functools import lru_cache
+from typing import Optional
+
+import httpx
 
 # 添加项目根目录到 sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from config import settings
 from google.adk.agents import LlmAgent
-from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
-from google.adk.models.google_llm import Gemini
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
 from google.genai import types
+from src.utils.sessions import get_session_service, run_query
 
 # 初始化日志
 logger = settings.setup_logging("CustomerSupportClient")
 
+# 模块级复用的 HTTP 客户端：健康检查与 RemoteA2aAgent 共用同一个连接池
+_http_client: Optional[httpx.AsyncClient] = None
+
+# 连接池参数：空闲连接保留 30 秒，健康检查之后紧接着的 A2A 请求可以直接复用同一条 TCP/TLS 连接
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100,
+    max_keepalive_connections=20,
+    keepalive_expiry=30,
+)
+
+# 模型重试策略：模块级常量，所有 Support Agent 共用同一个实例
+RETRY_CONFIG = types.HttpRetryOptions(attempts=3, exp_base=2, initial_delay=1)
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Lazily create (or recreate after close) the shared httpx client."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=HTTP_LIMITS,
+            follow_redirects=True,
+        )
+    return _http_client
+
+async def close_http_client() -> None:
+    """Close the shared httpx client if it was created, and drop the Runner that captured it."""
+    global _http_client
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+    _http_client = None
+    # 缓存的 Runner 中的 RemoteA2aAgent 仍持有已关闭的客户端 (且绑定在当前事件循环上)，
+    # 一并清掉缓存，下次 _build_runner 会用新的客户端重新构建
+    _build_runner.cache_clear()
+
 async def check_remote_service(url: str) -> bool:
-    """Health check for the remote A2A service."""
+    """Health check for the remote A2A service (HEAD request, no body transfer)."""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=2) as response:
-                if response.status == 200:
-                    logger.info(f"✅ Connected to remote agent at: {url}")
-                    return True
-                else:
-                    logger.error(f"❌ Remote agent returned status: {response.status}")
-                    return False
+        response = await _get_http_client().head(url, timeout=2)
+        if response.status_code < 400:
+            logger.info("✅ Connected to remote agent at: %s", url)
+            return True
+        else:
+            logger.error("❌ Remote agent returned status: %s", response.status_code)
+            return False
     except Exception as e:
-        logger.error(f"❌ Failed to connect to remote agent: {str(e)}")
+        logger.error("❌ Failed to connect to remote agent: %s", e)
         logger.warning("💡 Hint: Is the Product Catalog Service running?")
         return False
 
-async def run_customer_support_flow(user_query: str):
+APP_NAME = "support_cli_app"
+USER_ID = "cli_user"
+
+@lru_cache(maxsize=None)
+def _build_runner(model_name: str = settings.DEFAULT_MODEL_NAME) -> Runner:
     """
-    Orchestrates the interaction between User -> Support Agent -> Remote Catalog Agent.
+    Build (once per model name) the Support Agent + Runner pair.
+    The Runner and its session service are reused across queries until close_http_client()
+    closes the HTTP client it captured (which also clears this cache).
     """
-    # Step 0: Pre-flight check
-    if not await check_remote_service(settings.AGENT_CARD_FULL_URL):
-        return
+    # RemoteA2aAgent 会拉起整个 a2a SDK：只在真正构建 Runner 时导入 (远程服务不可用时无需加载)
+    from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
+    from google.adk.models.google_llm import Gemini
 
     # Step 1: Define Remote Agent (The Proxy)
     remote_catalog_agent = RemoteA2aAgent(
         name="product_catalog_agent",
         description="Remote product catalog service. Use this to look up product details.",
-        agent_card=settings.AGENT_CARD_FULL_URL
+        agent_card=settings.AGENT_CARD_FULL_URL,
+        httpx_client=_get_http_client(),
     )
 
     # Step 2: Define Local Support Agent (The Consumer)
-    retry_config = types.HttpRetryOptions(attempts=3, exp_base=2, initial_delay=1)
-    
     support_agent = LlmAgent(
-        model=Gemini(model=settings.DEFAULT_MODEL_NAME, retry_options=retry_config),
+        model=Gemini(model=model_name, retry_options=RETRY_CONFIG),
         name="customer_support_agent",
         description="Customer support assistant.",
         instruction="""
@@ -66,49 +106,56 @@ async def run_customer_support_flow(user_query: str):
         sub_agents=[remote_catalog_agent]
     )
 
-    # Step 3: Session & Runner Setup
-    session_service = InMemorySessionService()
-    session_id = f"session_{uuid.uuid4().hex[:8]}"
-    app_name = "support_cli_app"
-    user_id = "cli_user"
-
-    await session_service.create_session(
-        app_name=app_name, 
-        user_id=user_id, 
-        session_id=session_id
+    return Runner(
+        agent=support_agent, 
+        app_name=APP_NAME, 
+        session_service=get_session_service()
     )
 
-    runner = Runner(
-        agent=support_agent, 
-        app_name=app_name, 
-        session_service=session_service
+async def run_customer_support_flow(user_query: str):
+    """
+    Orchestrates the interaction between User -> Support Agent -> Remote Catalog Agent.
+    """
+    # Step 0: Pre-flight check
+    if not await check_remote_service(settings.AGENT_CARD_FULL_URL):
+        return
+
+    # Step 1-2: Agents & Runner (cached per process)
+    runner = _build_runner()
+
+    # Step 3: Session Setup
+    session_id = f"session_{secrets.token_hex(4)}"
+
+    await runner.session_service.create_session(
+        app_name=APP_NAME, 
+        user_id=USER_ID, 
+        session_id=session_id
     )
 
     # Step 4: Execution
-    logger.info(f"👤 User Query: {user_query}")
+    logger.info("👤 User Query: %s", user_query)
     logger.info("🤖 Support Agent is thinking...")
     
     try:
-        user_msg = types.Content(parts=[types.Part(text=user_query)])
-        
-        async for event in runner.run_async(
-            user_id=user_id, 
-            session_id=session_id, 
-            new_message=user_msg
-        ):
-            if event.is_final_response() and event.content:
-                response_text = event.content.parts[0].text
-                print("\n" + "="*50)
-                print(f"💬 Response:\n{response_text}")
-                print("="*50 + "\n")
+        for response_text in await run_query(runner, USER_ID, session_id, user_query):
+            print("\n" + "="*50)
+            print(f"💬 Response:\n{response_text}")
+            print("="*50 + "\n")
                 
     except Exception as e:
-        logger.error(f"Runtime error during agent execution: {e}", exc_info=True)
+        logger.error("Runtime error during agent execution: %s", e, exc_info=True)
+
+async def main(user_query: str):
+    try:
+        await run_customer_support_flow(user_query)
+    finally:
+        # 进程退出前释放共享的 HTTP 客户端
+        await close_http_client()
 
 if __name__ == "__main__":
     try:
         settings.get_api_key()
         query = "Hi, do you have the iPhone 15 Pro in stock? And how much is it?"
-        asyncio.run(run_customer_support_flow(query))
+        asyncio.run(main(query))
     except ValueError as e:
         logger.error(e)
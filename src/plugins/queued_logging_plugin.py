@@ -0,0 +1,20 @@
+import logging
+
+from google.adk.plugins.logging_plugin import LoggingPlugin
+
+logger = logging.getLogger("logging_plugin")
+
+class QueuedLoggingPlugin(LoggingPlugin):
+    """
+    Drop-in replacement for ADK's LoggingPlugin that logs instead of printing.
+
+    LoggingPlugin 在每个回调点逐行 print() (每行一次同步的 stdout 写入)，直接阻塞事件循环。
+    这里把每一行交给 logging 模块：settings.setup_logging 在 Root Logger 上只挂了一个 QueueHandler，
+    事件循环只做一次入队，格式化与控制台 / 文件 I/O 都由后台 QueueListener 线程完成。
+    """
+
+    def __init__(self, name: str = "logging_plugin") -> None:
+        super().__init__(name=name)
+
+    def _log(self, message: str) -> None:
+        logger.info("[%s] %s", self.name, message)
@@ -1,4 +1,5 @@
 import logging
+import threading
 from typing import Dict, Any, Optional
 from google.adk.agents.base_agent import BaseAgent
 from google.adk.agents.callback_context import CallbackContext
@@ -29,14 +30,18 @@ class TelemetryPlugin(BasePlugin):
             "llm_requests": 0,
             "errors": 0
         }
+        # 同一事件循环内 `+=` 本身就不会被打断，但 Runner.run() 等同步入口会在后台线程里
+        # 跑事件循环，同一个插件实例被多个线程共享时 `+=` 可能丢失计数；
+        # 自增与写回 self.metrics 在同一把锁内完成 (无竞争时加锁开销只有几十纳秒)。
+        self._lock = threading.Lock()
         logger.info("📊 TelemetryPlugin initialized")
 
     async def before_agent_callback(
         self, *, agent: BaseAgent, callback_context: CallbackContext, **kwargs: Any
     ) -> None:
         """Called before an agent starts execution."""
-        self.metrics["agent_runs"] += 1
-        logger.info(f"▶️  [Telemetry] Agent '{agent.name}' starting. (Total runs: {self.metrics['agent_runs']})")
+        runs = self._incr("agent_runs")
+        logger.info("▶️  [Telemetry] Agent %r starting. (Total runs: %d)", agent.name, runs)
 
     async def after_tool_callback(
         self, 
@@ -45,35 +50,45 @@ class TelemetryPlugin(BasePlugin):
         **kwargs: Any
     ) -> None:
         """Called after a tool finishes execution."""
-        self.metrics["tool_calls"] += 1
+        calls = self._incr("tool_calls")
         
         # 调试信息：如果想知道框架到底传了什么参数，可以取消下面这行的注释
-        # logger.debug(f"🔍 [Telemetry] after_tool_callback received args: {list(kwargs.keys())}")
+        # logger.debug("🔍 [Telemetry] after_tool_callback received args: %s", list(kwargs))
         
         # Log tool usage with a distinct icon for visibility
-        logger.info(f"🛠️  [Telemetry] Tool '{tool.name}' executed. (Total calls: {self.metrics['tool_calls']})")
+        logger.info("🛠️  [Telemetry] Tool %r executed. (Total calls: %d)", tool.name, calls)
 
     async def before_model_callback(
         self, *, callback_context: CallbackContext, llm_request: LlmRequest, **kwargs: Any
     ) -> None:
         """Called before sending a request to the LLM."""
-        self.metrics["llm_requests"] += 1
-        logger.debug(f"🧠 [Telemetry] LLM Request initiated. (Total requests: {self.metrics['llm_requests']})")
+        requests = self._incr("llm_requests")
+        # 最频繁的回调：DEBUG 关闭时只剩一次计数，不进入 logging 调用
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🧠 [Telemetry] LLM Request initiated. (Total requests: %d)", requests)
 
     async def on_model_error_callback(
         self, *, callback_context: CallbackContext, error: Exception, **kwargs: Any
     ) -> None:
         """Called when the model encounters an error."""
-        self.metrics["errors"] += 1
-        logger.error(f"❌ [Telemetry] Model Error detected: {str(error)}")
+        self._incr("errors")
+        logger.error("❌ [Telemetry] Model Error detected: %s", error)
+
+    def _incr(self, key: str) -> int:
+        """Atomically increments a counter and returns its new value."""
+        with self._lock:
+            value = self.metrics[key] = self.metrics[key] + 1
+        return value
 
     def get_summary(self) -> str:
         """Returns a formatted summary of the session metrics."""
+        with self._lock:
+            metrics = dict(self.metrics)
         return (
             "\n📊 --- Session Telemetry Summary ---\n"
-            f"   🔹 Agent Runs:   {self.metrics['agent_runs']}\n"
-            f"   🔹 Tool Calls:   {self.metrics['tool_calls']}\n"
-            f"   🔹 LLM Requests: {self.metrics['llm_requests']}\n"
-            f"   🔹 Errors:       {self.metrics['errors']}\n"
+            f"   🔹 Agent Runs:   {metrics['agent_runs']}\n"
+            f"   🔹 Tool Calls:   {metrics['tool_calls']}\n"
+            f"   🔹 LLM Requests: {metrics['llm_requests']}\n"
+            f"   🔹 Errors:       {metrics['errors']}\n"
             "-------------------------------------"
         )
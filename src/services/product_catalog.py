@@ -1,19 +1,178 @@
+import difflib
 import sys
 import os
-import uvicorn
-from typing import Dict
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+from urllib.parse import urlsplit
 
 # 添加项目根目录到 sys.path，确保能导入 config
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
 
 from config import settings
-from google.adk.agents import LlmAgent
-from google.adk.models.google_llm import Gemini
-from google.adk.a2a.utils.agent_to_a2a import to_a2a
 
 # 初始化日志
 logger = settings.setup_logging("ProductCatalogService")
 
+# --- 模拟数据库 (模块级只读常量，每次调用不再重新构建) ---
+_CATALOG: Mapping[str, Mapping[str, str]] = MappingProxyType({
+    "iphone 15 pro": MappingProxyType({
+        "price": "$999",
+        "stock": "In Stock",
+        "specs": "A17 Pro chip, Titanium design"
+    }),
+    "pixel 8 pro": MappingProxyType({
+        "price": "$999",
+        "stock": "Low Stock",
+        "specs": "Google Tensor G3, AI camera"
+    }),
+    "samsung galaxy s24": MappingProxyType({
+        "price": "$799",
+        "stock": "In Stock",
+        "specs": "Snapdragon 8 Gen 3"
+    }),
+})
+
+# 展示用的产品名 (导入时 title() 一次，查询路径上不再重复转换)
+_TITLES: Mapping[str, str] = MappingProxyType({db_key: db_key.title() for db_key in _CATALOG})
+
+# 命中时的完整回复 (目录只读，导入时一次性格式化，查询时只做字典取值)
+_RESPONSES: Mapping[str, str] = MappingProxyType({
+    db_key: (f"✅ Found: {_TITLES[db_key]}\n"
+             f"Price: {data['price']}\n"
+             f"Stock: {data['stock']}\n"
+             f"Specs: {data['specs']}")
+    for db_key, data in _CATALOG.items()
+})
+
+# 未命中时的可用列表建议 (只拼接一次)
+_AVAILABLE_STR: str = ", ".join(_TITLES.values())
+
+# 未命中时的模糊建议 (rapidfuzz 可选，缺失时回退到标准库 difflib)
+_CATALOG_KEYS: tuple[str, ...] = tuple(_CATALOG)
+_SUGGESTION_LIMIT = 5
+_SUGGESTION_CUTOFF = 70  # 0-100，difflib 使用 cutoff / 100
+
+# --- 子串匹配索引 (Tries) ---
+# 模糊匹配的语义：返回目录顺序中第一个满足 `key in db_key` 或 `db_key in key` 的产品。
+# 两个方向各用一棵字典树实现，查询耗时只与 key 长度有关，与目录大小无关：
+# - _SUFFIX_TRIE：所有目录 key 的全部后缀，key 能完整走完 <=> key 是某个目录 key 的子串；
+#   每个节点记录经过它的目录 key 的最小序号 (即目录中最靠前的匹配)。
+# - _PREFIX_TRIE：目录 key 本身，从 key 的每个位置出发向下走，遇到终止节点即某个目录 key 是 key 的子串。
+# 每次查询只有几十次字典取值，且结果由 _lookup 缓存：不引入 Numba / Cython 之类的编译依赖，
+# 也不要求查询是 ASCII (uint8 字节数组的做法无法处理非 ASCII 产品名)。
+_END = None  # 节点中保存目录序号的哨兵键 (字符键不可能是 None)
+
+# 字典树节点：字符 -> 子节点，_END -> 目录序号
+_TrieNode = dict[Optional[str], Any]
+
+def _build_suffix_trie(keys: tuple[str, ...]) -> _TrieNode:
+    root: _TrieNode = {_END: 0 if keys else None}
+    for index, db_key in enumerate(keys):
+        for start in range(len(db_key)):
+            node = root
+            for char in db_key[start:]:
+                node = node.setdefault(char, {_END: index})
+    return root
+
+def _build_prefix_trie(keys: tuple[str, ...]) -> _TrieNode:
+    root: _TrieNode = {}
+    for index, db_key in enumerate(keys):
+        node = root
+        for char in db_key:
+            node = node.setdefault(char, {})
+        node.setdefault(_END, index)
+    return root
+
+_SUFFIX_TRIE: _TrieNode = _build_suffix_trie(_CATALOG_KEYS)
+_PREFIX_TRIE: _TrieNode = _build_prefix_trie(_CATALOG_KEYS)
+
+# 长度分桶：key 比最长的目录 key 还长时方向 1 不可能命中；方向 2 只需从剩余长度 ≥ 最短目录 key 的位置出发
+_MIN_KEY_LEN: int = min(map(len, _CATALOG_KEYS), default=0)
+_MAX_KEY_LEN: int = max(map(len, _CATALOG_KEYS), default=0)
+
+def _match_index(key: str) -> Optional[int]:
+    """Index of the first catalog key that contains `key` or is contained in it, else None."""
+    best: Optional[int] = None
+    node: Optional[_TrieNode]
+
+    # 方向 1：key in db_key
+    if len(key) <= _MAX_KEY_LEN:
+        node = _SUFFIX_TRIE
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                break
+        else:
+            best = node[_END]
+            if best == 0:
+                return best
+
+    # 方向 2：db_key in key (从 key 的每个可能位置出发匹配目录 key)
+    for start in range(len(key) - _MIN_KEY_LEN + 1):
+        node = _PREFIX_TRIE
+        for char in key[start:start + _MAX_KEY_LEN]:
+            node = node.get(char)
+            if node is None:
+                break
+            index = node.get(_END)
+            if index is not None and (best is None or index < best):
+                best = index
+    return best
+
+# 查询结果缓存大小：目录只读，按归一化后的 key 缓存结果无需过期
+_LOOKUP_CACHE_SIZE = 4096
+
+try:
+    from rapidfuzz import fuzz, process as fuzz_process
+    _HAS_RAPIDFUZZ = True
+except ImportError:
+    _HAS_RAPIDFUZZ = False
+
+@lru_cache(maxsize=1024)
+def _normalize(product_name: str) -> str:
+    """Normalize a product name into a catalog key (cached for repeated queries)."""
+    # 先 strip 再转小写：大小写转换只处理去掉空白后的部分。
+    # casefold 与 lower 同为 C 实现的单次遍历 (str.translate 映射表反而慢约 10 倍)，
+    # 且对 "ß" 等字符做完整的大小写折叠；目录 key 均为 ASCII，二者结果相同
+    return product_name.strip().casefold()
+
+@lru_cache(maxsize=_LOOKUP_CACHE_SIZE)
+def _suggest(key: str) -> str:
+    """
+    Return up to _SUGGESTION_LIMIT display names that look like `key` (best match first),
+    joined with ", ", or "" when nothing is close. Cached, so repeated misses reuse the string.
+    """
+    if _HAS_RAPIDFUZZ:
+        matches = fuzz_process.extract(
+            key, _CATALOG_KEYS, scorer=fuzz.WRatio,
+            limit=_SUGGESTION_LIMIT, score_cutoff=_SUGGESTION_CUTOFF,
+        )
+        return ", ".join(_TITLES[match] for match, _score, _index in matches)
+    return ", ".join(_TITLES[match] for match in difflib.get_close_matches(
+        key, _CATALOG_KEYS, n=_SUGGESTION_LIMIT, cutoff=_SUGGESTION_CUTOFF / 100
+    ))
+
+@lru_cache(maxsize=_LOOKUP_CACHE_SIZE)
+def _lookup(key: str) -> Optional[str]:
+    """
+    Return the formatted details for a normalized key, or None when nothing matches.
+
+    目录只读，缓存无需失效；测试中替换目录数据后可调用 _lookup.cache_clear()。
+    """
+    # 精确匹配：一次哈希查找
+    found = _RESPONSES.get(key)
+    if found is not None:
+        return found
+
+    # 模糊匹配逻辑 (子串双向匹配，走字典树而不是逐个扫描目录)
+    index = _match_index(key)
+    if index is None:
+        return None
+    return _RESPONSES[_CATALOG_KEYS[index]]
+
 # --- 核心业务逻辑 ---
 def get_product_info(product_name: str) -> str:
     """
@@ -25,102 +184,154 @@ def get_product_info(product_name: str) -> str:
     Returns:
         A formatted string with product details or availability status.
     """
-    logger.info(f"🔍 Querying catalog for: {product_name}")
-    
-    # 模拟数据库
-    catalog = {
-        "iphone 15 pro": {
-            "price": "$999",
-            "stock": "In Stock",
-            "specs": "A17 Pro chip, Titanium design"
-        },
-        "pixel 8 pro": {
-            "price": "$999",
-            "stock": "Low Stock",
-            "specs": "Google Tensor G3, AI camera"
-        },
-        "samsung galaxy s24": {
-            "price": "$799",
-            "stock": "In Stock",
-            "specs": "Snapdragon 8 Gen 3"
-        }
-    }
-    
-    key = product_name.lower().strip()
+    logger.info("🔍 Querying catalog for: %s", product_name)
+    return _product_info(product_name)
+
+def get_product_infos(product_names: list[str]) -> list[str]:
+    """
+    Retrieves product details for several products in one call (e.g. to compare them).
+
+    Args:
+        product_names: The names of the products to query.
+
+    Returns:
+        One formatted string per requested product, in the same order.
+    """
+    logger.info("🔍 Querying catalog for %d products: %s", len(product_names), product_names)
+    # 一次工具调用回答多个产品：比较类问题不再需要模型多轮调用 get_product_info
+    return [_product_info(product_name) for product_name in product_names]
+
+def _product_info(product_name: str) -> str:
+    # "iPhone 15 Pro" 与 " iphone 15 pro" 归一化为同一个 key，重复查询直接命中 _lookup 的缓存
+    key = _normalize(product_name)
     try:
-        # 模糊匹配逻辑
-        for db_key, data in catalog.items():
-            if key in db_key or db_key in key:
-                return (f"✅ Found: {db_key.title()}\n"
-                        f"Price: {data['price']}\n"
-                        f"Stock: {data['stock']}\n"
-                        f"Specs: {data['specs']}")
+        found = _lookup(key)
+        if found is not None:
+            return found
         
-        # 生成可用列表建议
-        available = ", ".join([k.title() for k in catalog.keys()])
-        return f"❌ Product '{product_name}' not found. Available items: {available}"
+        # 优先给出相近的产品建议，没有相近项时再列出全部可用产品
+        did_you_mean = _suggest(key)
+        if did_you_mean:
+            return f"❌ Product '{product_name}' not found. Did you mean: {did_you_mean}?"
+        return f"❌ Product '{product_name}' not found. Available items: {_AVAILABLE_STR}"
     except Exception as e:
-        logger.error(f"Database error: {e}", exc_info=True)
+        logger.error("Database error: %s", e, exc_info=True)
         return "⚠️ System Error: Unable to access product catalog."
 
+# --- Agent 指令 (Instruction) ---
+# 全部为静态内容 (包括可用产品列表)，作为 static_instruction 放在请求最前面，
+# 每次请求的前缀都相同，可命中 Gemini 的前缀缓存；唯一变化的是用户的查询本身
+_STATIC_INSTRUCTION = f"""
+        You are the Product Catalog Agent (Vendor Side).
+        Your ONLY role is to fetch product data using the 'get_product_info' tool.
+        - When the user asks about several products (e.g. a comparison), call 'get_product_infos' once with all of them.
+        - If the tool returns data, present it clearly.
+        - If the tool says 'not found', inform the user politely.
+        - Do not invent product details.
+
+        Products in the catalog: {_AVAILABLE_STR}
+        """
+
 # --- 服务启动逻辑 ---
-def main():
-    try:
-        settings.get_api_key() # 验证 API Key
-    except ValueError as e:
-        logger.error(e)
-        return
+def _build_app(port: int):
+    """
+    构建 product_catalog_agent 并转换为 A2A 应用 (每个进程只调用一次)。
+
+    Args:
+        port: 服务监听的端口，未设置 PUBLIC_URL 时用于生成 Agent Card 中的地址。
+    """
+    # ADK / genai / a2a 依赖链较重，只在真正构建服务时导入：
+    # 只使用 get_product_info 等工具函数 (例如单元测试) 的导入方无需承担这部分开销
+    from google.adk.a2a.utils.agent_to_a2a import to_a2a
+    from google.adk.agents import LlmAgent
+    from google.adk.models.google_llm import Gemini
 
     logger.info("🚀 Initializing Product Catalog Agent...")
 
-    # 创建 Agent
     agent = LlmAgent(
         model=Gemini(model=settings.DEFAULT_MODEL_NAME),
         name="product_catalog_agent",
         description="External vendor's product catalog service. Provides price, stock, and specs.",
-        instruction="""
-        You are the Product Catalog Agent (Vendor Side).
-        Your ONLY role is to fetch product data using the 'get_product_info' tool.
-        - If the tool returns data, present it clearly.
-        - If the tool says 'not found', inform the user politely.
-        - Do not invent product details.
-        """,
-        tools=[get_product_info]
+        static_instruction=_STATIC_INSTRUCTION,
+        # 工具是纯函数：结果已由进程级的 _lookup / _suggest LRU 缓存 (跨 Session 共享)，
+        # 不再额外挂 before_tool_callback 做 Session 级缓存 (ADK 也没有 tool_cache 开关)
+        tools=[get_product_info, get_product_infos]
     )
 
     # 转换为 A2A 服务
-    # 关键修复：显式传入 public_url，确保生成的 Agent Card 包含正确的公网地址
-    public_url = os.environ.get("PUBLIC_URL", f"http://{settings.SERVICE_HOST}:{settings.SERVICE_PORT}")
-    logger.info(f"📝 Generating Agent Card with URL: {public_url}")
-    
-    app = to_a2a(agent, port=settings.SERVICE_PORT, url=public_url)
-    return app
+    # 关键修复：Agent Card 必须包含正确的公网地址 (Cloud Run 上由 PUBLIC_URL 指定)。
+    # to_a2a 没有 url 参数，需要拆成 protocol / host / port 传入；port 只用于生成 Card 地址，
+    # 实际监听端口由 uvicorn / gunicorn 决定
+    # 响应序列化由 a2a SDK 的路由内部完成 (Starlette JSONResponse，没有 default_response_class 可替换)，
+    # 这里不去猴子补丁 SDK 内部类换成 orjson
+    public_url = os.environ.get("PUBLIC_URL", f"http://{settings.SERVICE_HOST}:{port}")
+    logger.info("📝 Generating Agent Card with URL: %s", public_url)
+    url = urlsplit(public_url)
+    return to_a2a(
+        agent,
+        host=url.hostname,
+        port=url.port or (443 if url.scheme == "https" else 80),
+        protocol=url.scheme,
+    )
+
+def main(workers: int = 1):
+    """
+    本地调试入口：验证 API Key 后返回交给 uvicorn.run 的目标 (失败时返回 None)。
+    多 worker 时返回导入字符串：每个 worker 进程重新导入本模块，通过模块级 __getattr__ 各自构建 app，
+    父进程不再额外构建一份用不到的 Agent。
+    """
+    try:
+        settings.get_api_key() # 验证 API Key
+    except ValueError as e:
+        logger.error(e)
+        return None
 
-# 全局 app 对象，供 Gunicorn/Uvicorn 导入使用
+    if workers > 1:
+        return "src.services.product_catalog:app"
+    return _build_app(settings.SERVICE_PORT)
+
+# 全局 app 对象，供 Gunicorn/Uvicorn 以 "src.services.product_catalog:app" 导入使用
 # 注意：这里我们不再直接调用 uvicorn.run，而是暴露 app 对象
-app = None
+_app = None
+
+def __getattr__(name: str) -> Any:
+    """
+    模块级懒属性 (PEP 562)：首次访问 `app` 时才构建 A2A 应用。
+    gunicorn / uvicorn 的 module:app 查找都通过 getattr 完成 (--preload 时在 master 中构建一次)；
+    只导入 get_product_info 等工具函数的调用方 (例如单元测试) 不会加载 ADK / a2a，也不会构建 Agent。
+    """
+    if name != "app":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    global _app
+    if _app is None:
+        try:
+            settings.get_api_key()
+            # 注意：Cloud Run 会通过环境变量 PORT 覆盖这里的端口设置
+            _app = _build_app(int(os.environ.get("PORT", settings.SERVICE_PORT)))
+        except Exception as e:
+            # 失败不缓存：记录日志后抛出，让 gunicorn / uvicorn 以导入错误退出
+            logger.error("Failed to initialize app: %s", e)
+            raise
+    return _app
+
 if __name__ == "__main__":
     # 本地调试模式
-    app = main()
-    logger.info(f"📡 Starting A2A Server on port {settings.SERVICE_PORT}...")
-    uvicorn.run(app, host=settings.SERVICE_HOST, port=settings.SERVICE_PORT)
-else:
-    # 生产模式 (被 Gunicorn 导入时)
-    # 我们需要在这里初始化 app，但不要调用 uvicorn.run
-    try:
-        settings.get_api_key()
-        # 初始化 Agent
-        agent = LlmAgent(
-            model=Gemini(model=settings.DEFAULT_MODEL_NAME),
-            name="product_catalog_agent",
-            description="External vendor's product catalog service.",
-            instruction="You are the Product Catalog Agent.",
-            tools=[get_product_info]
-        )
-        # 创建 app 对象
-        # 注意：Cloud Run 会通过环境变量 PORT 覆盖这里的端口设置，但 to_a2a 需要一个默认值
-        public_url = os.environ.get("PUBLIC_URL", f"http://0.0.0.0:{os.environ.get('PORT', settings.SERVICE_PORT)}")
-        app = to_a2a(agent, port=int(os.environ.get("PORT", settings.SERVICE_PORT)), url=public_url)
-    except Exception as e:
-        logger.error(f"Failed to initialize app: {e}")
+    # 默认 max(2, CPU 核数 / 2) 个 worker，可通过 CATALOG_WORKERS 覆盖 (例如调试时设为 1)
+    # 注意：每个 worker 有独立的内存 Session，同一 context 的多轮对话可能落在不同 worker 上
+    workers = int(os.environ.get("CATALOG_WORKERS", max(2, (os.cpu_count() or 1) // 2)))
+    target = main(workers)
+    if target is not None:
+        import uvicorn
 
+        logger.info("📡 Starting A2A Server on port %s (%d workers)...", settings.SERVICE_PORT, workers)
+        uvicorn.run(
+            target,
+            host=settings.SERVICE_HOST,
+            port=settings.SERVICE_PORT,
+            workers=workers,
+            app_dir=ROOT_DIR,
+            # auto: 安装了 uvloop / httptools (uvicorn[standard]) 时自动使用，Windows 上回退到 asyncio / h11
+            loop="auto",
+            http="auto",
+            log_level=settings.LOG_LEVEL_STR.lower(),
+        )
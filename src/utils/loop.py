@@ -0,0 +1,16 @@
+import asyncio
+from typing import Any, Coroutine, TypeVar
+
+T = TypeVar("T")
+
+
+def run_main(main: Coroutine[Any, Any, T]) -> T:
+    """
+    asyncio.run 的替代：安装了 uvloop 时使用 uvloop 事件循环，
+    否则 (例如 Windows) 回退到默认事件循环。
+    """
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(main)
+    return uvloop.run(main)
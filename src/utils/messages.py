@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+from google.genai import types
+
+
+@lru_cache(maxsize=256)
+def make_user_msg(text: str) -> types.Content:
+    """
+    Build the user-role Content for a query, reusing the instance for repeated queries.
+
+    Runner only reads new_message (it is copied into the session as an event),
+    so sharing one instance per distinct text is safe as long as callers never mutate it.
+    """
+    return types.Content(role="user", parts=[types.Part(text=text)])
@@ -0,0 +1,124 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncGenerator, Callable, Optional, Sequence, Union
+
+from google.adk.events import Event
+from google.adk.memory import InMemoryMemoryService
+from google.adk.runners import Runner
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+
+from src.utils.messages import make_user_msg
+
+# 进程级共享的 Session / Memory Service。
+# 两者内部都已按 app_name / user_id (/ session_id) 分区存储，
+# 因此不同 App 可以安全地共用同一个实例。
+_session_service: Optional[InMemorySessionService] = None
+_memory_service: Optional[InMemoryMemoryService] = None
+
+# get_or_create_session 的存在性探测只需要最近 1 条事件 (num_recent_events=0 表示不限制)
+_PROBE_CONFIG = GetSessionConfig(num_recent_events=1)
+
+
+def get_session_service() -> InMemorySessionService:
+    """Return the process-wide InMemorySessionService, creating it on first use."""
+    global _session_service
+    if _session_service is None:
+        _session_service = InMemorySessionService()
+    return _session_service
+
+
+def get_memory_service() -> InMemoryMemoryService:
+    """Return the process-wide InMemoryMemoryService, creating it on first use."""
+    global _memory_service
+    if _memory_service is None:
+        _memory_service = InMemoryMemoryService()
+    return _memory_service
+
+
+async def get_or_create_session(
+    session_service: BaseSessionService, app_name: str, user_id: str, session_id: str
+) -> Session:
+    """
+    Retrieve the session, creating it only if it does not exist yet.
+
+    只用于确认 Session 存在 (调用方只使用 session.id)：探测时最多加载最近 1 条事件，
+    不会为已有的长对话读取 / 复制整段历史。需要完整事件时请直接调用 get_session。
+
+    Session 已存在 (多轮对话的常见情况) 时只有一次 get_session；只有首次才多一次 create_session。
+    不直接写 INSERT ... ON CONFLICT：create_session 还会初始化 app / user 级 state，
+    绕过 Session Service 会破坏这部分逻辑，也无法同时适用于 InMemory 与 Database 两种实现。
+    """
+    # get_session 在 Session 不存在时返回 None，无需用 try/except 先插入再回滚
+    session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id, config=_PROBE_CONFIG
+    )
+    if session is None:
+        session = await session_service.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+    return session
+
+
+async def consume_stream(
+    events: AsyncGenerator[Event, None],
+    on_event: Optional[Callable[[Event], None]] = None,
+) -> list[str]:
+    """
+    Drain a Runner event stream and return the final response texts.
+
+    on_event (可选) 对每个事件调用一次，例如边接收边输出文本、检查审批请求。
+    事件流总是被完整消费：Runner 在最后一个事件 yield 之后才执行 after_agent_callback
+    与事件压缩，因此不能在最终回复后提前 break；aclosing 保证异常时生成器也会被关闭。
+    """
+    texts = []
+    async with aclosing(events) as stream:
+        async for event in stream:
+            if on_event is not None:
+                on_event(event)
+            # 流式增量事件直接跳过，避免每个事件都访问 .content
+            if not event.is_final_response():
+                continue
+            parts = event.content.parts if event.content else None
+            if not parts:
+                continue
+            text = parts[0].text
+            if text and text != "None":
+                texts.append(text)
+    return texts
+
+
+async def run_query(runner: Runner, user_id: str, session_id: str, query: str) -> list[str]:
+    """Send one user query through the runner and return the final response texts."""
+    return await consume_stream(runner.run_async(
+        user_id=user_id, session_id=session_id, new_message=make_user_msg(query)
+    ))
+
+
+async def run_batch_async(
+    runner: Runner,
+    user_id: str,
+    queries: Sequence[str],
+    session_ids: Sequence[str],
+    max_concurrency: int = 8,
+) -> list[Union[list[str], BaseException]]:
+    """
+    Run independent (query, session_id) pairs concurrently and return their final texts in order.
+
+    最多 max_concurrency 个查询同时执行；Session 不存在时自动创建。
+    return_exceptions=True：单个查询失败时对应位置返回异常对象，不影响其他查询。
+    同一个 session_id 上的多轮对话互相依赖，应按顺序调用 run_query，而不是放进同一个批次。
+    """
+    if len(queries) != len(session_ids):
+        raise ValueError("queries and session_ids must have the same length")
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(query: str, session_id: str) -> list[str]:
+        async with semaphore:
+            await get_or_create_session(runner.session_service, runner.app_name, user_id, session_id)
+            return await run_query(runner, user_id, session_id, query)
+
+    return await asyncio.gather(
+        *(run_one(query, session_id) for query, session_id in zip(queries, session_ids)),
+        return_exceptions=True,
+    )
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.client import customer_support
+
+
+class TestRunnerLifecycle(unittest.TestCase):
+    """缓存的 Runner 不能比它捕获的 HTTP 客户端活得更久。"""
+
+    def tearDown(self):
+        asyncio.run(customer_support.close_http_client())
+
+    def test_close_http_client_drops_cached_runner(self):
+        runner = customer_support._build_runner()
+        self.assertIs(customer_support._build_runner(), runner)
+        old_client = runner.agent.sub_agents[0]._httpx_client
+        self.assertIs(old_client, customer_support._get_http_client())
+
+        asyncio.run(customer_support.close_http_client())
+        self.assertTrue(old_client.is_closed)
+
+        new_runner = customer_support._build_runner()
+        self.assertIsNot(new_runner, runner)
+        new_client = new_runner.agent.sub_agents[0]._httpx_client
+        self.assertFalse(new_client.is_closed)
+        self.assertIs(new_client, customer_support._get_http_client())
+
+
+if __name__ == "__main__":
+    unittest.main()
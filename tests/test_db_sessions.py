@@ -0,0 +1,109 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    import aiosqlite  # noqa: F401
+except ImportError:  # DatabaseSessionService 使用 sqlite+aiosqlite 驱动
+    aiosqlite = None
+
+from google.adk.events import Event, EventActions
+from google.adk.sessions import DatabaseSessionService
+from google.genai import types
+
+from session_demo_agent.db import create_db_session_service
+
+APP_NAME = "test_db_app"
+USER_ID = "test_user"
+
+
+@unittest.skipIf(aiosqlite is None, "aiosqlite not installed")
+class TestSerializedWriteSessionService(unittest.IsolatedAsyncioTestCase):
+    """
+    每个测试使用独立的临时数据库文件：写锁按 db_url 在进程内共享，
+    而 IsolatedAsyncioTestCase 每个测试方法都有自己的事件循环。
+    """
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        db_path = os.path.join(self.tmp_dir.name, f"{self._testMethodName}.db")
+        self.db_url = f"sqlite+aiosqlite:///{db_path}"
+        self.service = create_db_session_service(self.db_url)
+
+    async def asyncTearDown(self):
+        await self.service.db_engine.dispose()
+
+    def _event(self, i: int) -> Event:
+        return Event(
+            author="agent",
+            invocation_id=f"inv_{i}",
+            content=types.Content(role="model", parts=[types.Part(text=f"reply {i}")]),
+            actions=EventActions(state_delta={f"key_{i}": i}),
+        )
+
+    async def test_sqlite_pragmas_applied(self):
+        async with self.service.db_engine.connect() as conn:
+            journal_mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+            synchronous = (await conn.exec_driver_sql("PRAGMA synchronous")).scalar()
+        self.assertEqual(journal_mode.lower(), "wal")
+        self.assertEqual(synchronous, 1)  # NORMAL
+
+    async def test_same_db_url_shares_write_lock(self):
+        other = create_db_session_service(self.db_url)
+        try:
+            self.assertIs(other._write_lock, self.service._write_lock)
+        finally:
+            await other.db_engine.dispose()
+
+    async def test_concurrent_writes_are_serialized(self):
+        original = DatabaseSessionService.append_event
+        active = 0
+        max_active = 0
+
+        async def tracking_append_event(service, session, event):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            try:
+                return await original(service, session, event)
+            finally:
+                active -= 1
+
+        sessions = await asyncio.gather(*(
+            self.service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=f"s{i}")
+            for i in range(8)
+        ))
+        with mock.patch.object(DatabaseSessionService, "append_event", tracking_append_event):
+            await asyncio.gather(*(
+                self.service.append_event(session, self._event(i))
+                for i, session in enumerate(sessions)
+            ))
+        self.assertEqual(max_active, 1)
+
+        # 所有写入都已持久化，没有 "database is locked"
+        for i in range(8):
+            session = await self.service.get_session(
+                app_name=APP_NAME, user_id=USER_ID, session_id=f"s{i}"
+            )
+            self.assertEqual(len(session.events), 1)
+            self.assertEqual(session.state[f"key_{i}"], i)
+
+    async def test_delete_session(self):
+        await self.service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id="s0")
+        await self.service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id="s0")
+        self.assertIsNone(await self.service.get_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id="s0"
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()
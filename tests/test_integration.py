@@ -1,34 +1,50 @@
+import asyncio
 import unittest
 import sys
 import os
 
 # 添加项目根目录到 sys.path
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import httpx
 
 from config import settings
 from google.adk.agents import LlmAgent
-from google.adk.agents.remote_a2a_agent import RemoteA2aAgent
+from google.adk.agents.remote_a2a_agent import DEFAULT_TIMEOUT, RemoteA2aAgent
 from google.adk.models.google_llm import Gemini
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
+from src.utils.sessions import get_session_service, run_query
+
+# 设置 SERIAL_TESTS=1 (或 true/yes/on) 时按顺序逐个执行查询 (便于调试)，默认并发执行；
+# SERIAL_TESTS=0 / false 与未设置相同
+SERIAL_TESTS = settings.env_flag("SERIAL_TESTS")
 
 class TestA2AIntegration(unittest.IsolatedAsyncioTestCase):
     """
     集成测试套件：验证 Customer Support Agent 与 Product Catalog Service 的 A2A 交互。
     """
 
-    async def asyncSetUp(self):
-        # 1. 检查环境变量
+    @classmethod
+    def setUpClass(cls):
+        # 检查环境变量 (缺失时跳过整个测试类，不构建任何 Agent)
         try:
             settings.get_api_key()
         except ValueError:
-            self.skipTest("GOOGLE_API_KEY not found.")
+            raise unittest.SkipTest("GOOGLE_API_KEY not found.")
+
+    async def asyncSetUp(self):
+        # IsolatedAsyncioTestCase 每个测试方法使用独立的事件循环，而 httpx.AsyncClient 的连接池
+        # 绑定在创建它的事件循环上，因此 Agent / Runner 在每个测试方法的事件循环内构建：
+        # 同一测试内的所有并发查询复用这个客户端的 keep-alive 连接，测试结束时在同一循环内关闭
+        self.http_client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT)
 
-        # 2. 配置 Agent
+        # 1. 配置 Agent
         self.remote_agent = RemoteA2aAgent(
             name="product_catalog_agent",
-            agent_card=settings.AGENT_CARD_FULL_URL
+            agent_card=settings.AGENT_CARD_FULL_URL,
+            httpx_client=self.http_client,
         )
 
         self.local_agent = LlmAgent(
@@ -38,67 +54,89 @@ class TestA2AIntegration(unittest.IsolatedAsyncioTestCase):
             sub_agents=[self.remote_agent]
         )
 
-        # 3. 初始化 Session
-        self.session_service = InMemorySessionService()
+        # 2. 共享 Session Service 与 Runner
+        self.session_service = get_session_service()
         self.app_name = "test_suite"
         self.user_id = "test_runner"
-        self.session_id = "test_session_001"
-        
-        await self.session_service.create_session(
-            app_name=self.app_name,
-            user_id=self.user_id,
-            session_id=self.session_id
-        )
-        
+
         self.runner = Runner(
             agent=self.local_agent,
             app_name=self.app_name,
             session_service=self.session_service
         )
 
-    async def _get_agent_response(self, query: str) -> str:
-        """辅助函数：发送查询并获取最终文本响应"""
-        response_text = ""
-        user_msg = types.Content(parts=[types.Part(text=query)])
-        
+    async def asyncTearDown(self):
+        await self.runner.close()
+        await self.http_client.aclose()
+
+    async def _get_agent_response(self, query: str, session_id: str) -> str:
+        """
+        辅助函数：发送查询并获取最终文本响应。
+        事件流由 run_query 完整消费 (不在最终回复后 break，Runner 的收尾回调照常执行)，
+        中间的流式事件在访问 .content 之前就被跳过。
+        """
         try:
-            async for event in self.runner.run_async(
-                user_id=self.user_id,
-                session_id=self.session_id,
-                new_message=user_msg
-            ):
-                if event.is_final_response() and event.content:
-                    response_text = event.content.parts[0].text
+            texts = await run_query(self.runner, self.user_id, session_id, query)
         except Exception as e:
             self.fail(f"Agent execution failed: {e}")
-            
-        return response_text
+        return texts[-1] if texts else ""
+
+    async def _run_queries(self, queries: list[str]) -> list[str]:
+        """
+        辅助函数：为每个查询创建独立 Session，并发执行所有查询。
+        每个查询都是网络 I/O 密集型 (LLM + 远程 A2A 调用)，并发执行可将总耗时从 N 次往返压缩到约 1 次。
+        """
+        # Session Service 在进程内共享：Session ID 带上测试方法名，不同测试之间互不冲突
+        session_ids = [f"test_session_{self._testMethodName}_{i:03d}" for i in range(len(queries))]
+        await asyncio.gather(*(
+            self.session_service.create_session(
+                app_name=self.app_name,
+                user_id=self.user_id,
+                session_id=session_id
+            )
+            for session_id in session_ids
+        ))
+        if SERIAL_TESTS:
+            # 调试模式：逐个执行，日志与失败信息按用例顺序出现
+            return [
+                await self._get_agent_response(query, session_id)
+                for query, session_id in zip(queries, session_ids)
+            ]
+        return await asyncio.gather(*(
+            self._get_agent_response(query, session_id)
+            for query, session_id in zip(queries, session_ids)
+        ))
 
-    async def test_01_happy_path_iphone(self):
+    def _check_happy_path_iphone(self, response: str):
         """测试用例 1: 正常查询 (Happy Path)"""
-        print("\n🧪 Running Test: Query iPhone 15 Pro...")
-        response = await self._get_agent_response("Price of iPhone 15 Pro?")
-        print(f"   Agent Answer: {response}")
         self.assertIn("$999", response)
         self.assertIn("Titanium", response)
 
-    async def test_02_not_found(self):
+    def _check_not_found(self, response: str):
         """测试用例 2: 查询不存在的产品 (Error Handling)"""
-        print("\n🧪 Running Test: Query Non-existent Product...")
-        response = await self._get_agent_response("Do you have the Nokia 3310?")
-        print(f"   Agent Answer: {response}")
-        self.assertTrue(
-            "not found" in response.lower() or "sorry" in response.lower()
-        )
+        lowered = response.lower()
+        self.assertTrue("not found" in lowered or "sorry" in lowered)
 
-    async def test_03_complex_comparison(self):
+    def _check_complex_comparison(self, response: str):
         """测试用例 3: 复杂查询 (Multi-step / Comparison)"""
-        print("\n🧪 Running Test: Compare two products...")
-        response = await self._get_agent_response("Compare the price of Samsung Galaxy S24 and iPhone 15 Pro")
-        print(f"   Agent Answer: {response}")
         self.assertIn("799", response)
         self.assertIn("999", response)
 
+    async def test_queries_concurrently(self):
+        """并发执行全部测试查询，并用 subTest 保留每个用例的独立断言"""
+        cases = [
+            ("01_happy_path_iphone", "Price of iPhone 15 Pro?", self._check_happy_path_iphone),
+            ("02_not_found", "Do you have the Nokia 3310?", self._check_not_found),
+            ("03_complex_comparison", "Compare the price of Samsung Galaxy S24 and iPhone 15 Pro", self._check_complex_comparison),
+        ]
+        print(f"\n🧪 Running {len(cases)} test queries {'serially' if SERIAL_TESTS else 'concurrently'}...")
+        responses = await self._run_queries([query for _, query, _ in cases])
+
+        for (name, query, check), response in zip(cases, responses):
+            with self.subTest(name):
+                print(f"   [{name}] {query}\n   Agent Answer: {response}")
+                check(response)
+
 if __name__ == "__main__":
     print("🚀 Starting Integration Test Suite...")
     print(f"⚠️  Ensure Service is running at {settings.SERVICE_URL}!")
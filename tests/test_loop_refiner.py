@@ -0,0 +1,147 @@
+import asyncio
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import unittest
+from typing import AsyncGenerator
+from unittest import mock
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import settings
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.runners import InMemoryRunner
+from google.genai import types
+
+from src.utils.sessions import consume_stream
+from src.utils.messages import make_user_msg
+
+
+def _load_loop_refiner():
+    """文件名以数字开头，无法直接 import；导入时模块会检查 API Key，这里临时替换为假值。"""
+    path = os.path.join(ROOT_DIR, "multi_agent_demos", "04_loop_refiner.py")
+    spec = importlib.util.spec_from_file_location("loop_refiner", path)
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.object(settings, "get_api_key", return_value="test-key"):
+        spec.loader.exec_module(module)
+    return module
+
+
+loop_refiner = _load_loop_refiner()
+
+
+def _text_event(agent: BaseAgent, ctx: InvocationContext, text: str, **actions) -> Event:
+    return Event(
+        author=agent.name,
+        invocation_id=ctx.invocation_id,
+        content=types.Content(role="model", parts=[types.Part(text=text)]),
+        actions=EventActions(**actions),
+    )
+
+
+class StubCritic(BaseAgent):
+    """按顺序返回预设的评审意见。"""
+
+    replies: list[str]
+    calls: int = 0
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        reply = self.replies[self.calls]
+        self.calls += 1
+        # 让出事件循环，使投机的 Refiner 与 Critic 真正并发
+        await asyncio.sleep(0.01)
+        yield _text_event(self, ctx, reply, state_delta={"critique": reply})
+
+
+class StubRefiner(BaseAgent):
+    """每次在当前稿件后追加轮次编号，并通过 update_memory 记录一条要点。"""
+
+    calls: int = 0
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        self.calls += 1
+        loop_refiner.update_memory(f"tip {self.calls}")
+        story = f"{ctx.session.state['current_story']}+{self.calls}"
+        yield _text_event(self, ctx, story, state_delta={"current_story": story})
+
+
+class TestSpeculativeLoopAgent(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.memory_file = os.path.join(self.tmp_dir.name, "refiner_memory.json")
+        patcher = mock.patch.object(loop_refiner, "MEMORY_FILE", self.memory_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    async def _run_loop(self, critic_replies: list[str], max_iterations: int = 3):
+        self.critic = StubCritic(name="CriticAgent", replies=critic_replies)
+        self.refiner = StubRefiner(name="RefinerAgent")
+        loop = loop_refiner.SpeculativeLoopAgent(
+            name="StoryRefinementLoop",
+            sub_agents=[self.critic, self.refiner],
+            max_iterations=max_iterations,
+        )
+        runner = InMemoryRunner(agent=loop, app_name="test_loop")
+        session = await runner.session_service.create_session(
+            app_name="test_loop", user_id="u", state={"current_story": "draft"}
+        )
+        await consume_stream(runner.run_async(
+            user_id="u", session_id=session.id, new_message=make_user_msg("go")
+        ))
+        return await runner.session_service.get_session(
+            app_name="test_loop", user_id="u", session_id=session.id
+        )
+
+    def _memory_tips(self):
+        if not os.path.exists(self.memory_file):
+            return []
+        with open(self.memory_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _authors(self, session):
+        return [event.author for event in session.events if event.author != "user"]
+
+    async def test_approval_discards_speculative_draft(self):
+        session = await self._run_loop(["APPROVED"])
+
+        # 投机稿件已经生成，但没有写入 Session，也没有写入评审记忆
+        self.assertEqual(self.refiner.calls, 1)
+        self.assertEqual(session.state["current_story"], "draft")
+        self.assertEqual(self._authors(session), ["CriticAgent"])
+        self.assertEqual(self._memory_tips(), [])
+
+    async def test_rejection_commits_draft_then_approval_stops(self):
+        session = await self._run_loop(["Needs more tension.", "APPROVED"])
+
+        self.assertEqual(self.critic.calls, 2)
+        self.assertEqual(self.refiner.calls, 2)
+        # 只有第 1 轮的稿件被提交
+        self.assertEqual(session.state["current_story"], "draft+1")
+        self.assertEqual(session.state["critique"], "APPROVED")
+        self.assertEqual(self._authors(session), ["CriticAgent", "RefinerAgent", "CriticAgent"])
+        self.assertEqual(self._memory_tips(), ["tip 1"])
+
+    async def test_max_iterations(self):
+        session = await self._run_loop(["Again.", "Again."], max_iterations=2)
+
+        self.assertEqual(session.state["current_story"], "draft+1+2")
+        self.assertEqual(self._authors(session), ["CriticAgent", "RefinerAgent"] * 2)
+        self.assertEqual(self._memory_tips(), ["tip 1", "tip 2"])
+
+    def test_update_memory_outside_speculation_writes_directly(self):
+        self.assertEqual(loop_refiner.update_memory("  keep it short  "), {"status": "ok", "tips": 1})
+        self.assertEqual(loop_refiner.update_memory("keep it short")["tips"], 1)
+        self.assertEqual(self._memory_tips(), ["keep it short"])
+
+
+if __name__ == "__main__":
+    unittest.main()
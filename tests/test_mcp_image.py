@@ -0,0 +1,54 @@
+import base64
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from mcp_demo_agent import agent as mcp_agent
+
+
+class TestSaveBase64Image(unittest.TestCase):
+    """验证分块解码与一次性 b64decode 的结果一致。"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.tmp_dir.name, "image.png")
+        self.payload = os.urandom(10_000)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _saved_bytes(self, image_data: str) -> bytes:
+        mcp_agent._save_base64_image(image_data, self.file_name)
+        with open(self.file_name, "rb") as f:
+            return f.read()
+
+    def test_single_line_payload(self):
+        image_data = base64.b64encode(self.payload).decode("ascii")
+        # 较小的块大小，确保走多块路径
+        with mock.patch.object(mcp_agent, "_B64_CHUNK_SIZE", 1000):
+            self.assertEqual(self._saved_bytes(image_data), self.payload)
+
+    def test_line_wrapped_payload(self):
+        # encodebytes 每 76 个字符插入一个换行，块边界不再与 base64 分组对齐
+        image_data = base64.encodebytes(self.payload).decode("ascii")
+        self.assertIn("\n", image_data)
+        for chunk_size in (1000, 1001, 4 * 1024):
+            with self.subTest(chunk_size=chunk_size):
+                with mock.patch.object(mcp_agent, "_B64_CHUNK_SIZE", chunk_size):
+                    self.assertEqual(self._saved_bytes(image_data), self.payload)
+
+    def test_crlf_and_spaces(self):
+        image_data = base64.encodebytes(self.payload).decode("ascii").replace("\n", " \r\n")
+        with mock.patch.object(mcp_agent, "_B64_CHUNK_SIZE", 999):
+            self.assertEqual(self._saved_bytes(image_data), base64.b64decode(image_data))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from mcp_demo_agent import agent as mcp_agent
+
+
+class TestServerPath(unittest.TestCase):
+    """只缓存找到的入口路径；未找到时下次调用重新探测。"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.entry = os.path.join(self.tmp_dir.name, "index.js")
+
+        patchers = [
+            mock.patch.object(mcp_agent, "_resolved_server_path", None),
+            # 不探测本机的 npm / APPDATA，只使用环境变量候选
+            mock.patch.object(mcp_agent.shutil, "which", return_value=None),
+            mock.patch.dict(os.environ, {"MCP_SERVER_EVERYTHING_PATH": self.entry}),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        os.environ.pop("APPDATA", None)
+
+    def test_miss_is_not_cached(self):
+        self.assertIsNone(mcp_agent._server_path())
+
+        with open(self.entry, "w", encoding="utf-8"):
+            pass
+        self.assertEqual(mcp_agent._server_path(), self.entry)
+
+    def test_found_path_is_cached(self):
+        with open(self.entry, "w", encoding="utf-8"):
+            pass
+        self.assertEqual(mcp_agent._server_path(), self.entry)
+
+        with mock.patch.object(mcp_agent, "_server_path_candidates") as candidates:
+            self.assertEqual(mcp_agent._server_path(), self.entry)
+        candidates.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
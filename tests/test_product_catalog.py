@@ -0,0 +1,128 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from src.services import product_catalog
+from src.services.product_catalog import get_product_info, get_product_infos
+
+
+def _baseline_product_info(product_name: str) -> str:
+    """最初的实现：逐个扫描目录做双向子串匹配 (作为索引 / 缓存实现的参照)。"""
+    key = product_name.lower().strip()
+    for db_key, data in product_catalog._CATALOG.items():
+        if key in db_key or db_key in key:
+            return (f"✅ Found: {db_key.title()}\n"
+                    f"Price: {data['price']}\n"
+                    f"Stock: {data['stock']}\n"
+                    f"Specs: {data['specs']}")
+    available = ", ".join(k.title() for k in product_catalog._CATALOG)
+    return f"❌ Product '{product_name}' not found. Available items: {available}"
+
+
+def _all_substrings(text: str) -> list[str]:
+    return [text[i:j] for i in range(len(text)) for j in range(i + 1, len(text) + 1)]
+
+
+class TestProductCatalog(unittest.TestCase):
+    """索引化查询 (tries + 长度分桶 + LRU 缓存) 必须与原始的线性扫描结果一致。"""
+
+    def setUp(self):
+        # 数百次查询各记录一条 INFO 日志，测试期间关闭，避免写满 LOG_FILE
+        patcher = mock.patch.object(product_catalog.logger, "disabled", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assertMatchesBaseline(self, product_name: str):
+        expected = _baseline_product_info(product_name)
+        actual = get_product_info(product_name)
+        if expected.startswith("✅"):
+            self.assertEqual(actual, expected)
+        else:
+            # 未命中时的提示文案已改为优先给出相近产品，只要求同样判定为未找到
+            self.assertTrue(actual.startswith(f"❌ Product '{product_name}' not found."), actual)
+
+    def test_representative_inputs(self):
+        cases = [
+            # 精确匹配
+            "iphone 15 pro", "pixel 8 pro", "samsung galaxy s24",
+            # 前缀
+            "iphone", "pix", "samsung",
+            # 后缀 (多个产品都以 " pro" 结尾时取目录中最靠前的)
+            "15 pro", "8 pro", "pro", "s24",
+            # 中间的子串
+            "galaxy", "one 15", "el 8",
+            # 查询包含目录 key
+            "i want the pixel 8 pro please", "samsung galaxy s24 ultra",
+            # 大小写
+            "IPHONE 15 PRO", "Samsung Galaxy S24", "PiXeL",
+            # 首尾空白
+            "  pixel 8 pro \n", "\tgalaxy ", " IPHONE ",
+            # 空输入与未命中
+            "", "   ", "nokia 3310", "pixel 9", "iphone 16 pro", "samsung galaxy s25",
+        ]
+        for product_name in cases:
+            with self.subTest(product_name=product_name):
+                self.assertMatchesBaseline(product_name)
+
+    def test_every_substring_of_catalog_keys(self):
+        rng = random.Random(0)
+        for db_key in product_catalog._CATALOG:
+            for substring in _all_substrings(db_key):
+                # 随机改变大小写并加上首尾空白
+                variant = "".join(c.upper() if rng.random() < 0.5 else c for c in substring)
+                for product_name in (substring, f"  {variant}\t"):
+                    with self.subTest(product_name=product_name):
+                        self.assertMatchesBaseline(product_name)
+
+    def test_repeated_queries_use_cache(self):
+        product_catalog._lookup.cache_clear()
+        first = get_product_info("Pixel 8 Pro")
+        second = get_product_info("  pixel 8 pro ")
+        self.assertEqual(first, second)
+        self.assertEqual(product_catalog._lookup.cache_info().hits, 1)
+
+    def test_get_product_infos_matches_single_queries(self):
+        names = ["iphone", "  GALAXY ", "nokia", "pixel 8 pro", ""]
+        self.assertEqual(get_product_infos(names), [get_product_info(name) for name in names])
+        for name, result in zip(names, get_product_infos(names)):
+            with self.subTest(product_name=name):
+                if _baseline_product_info(name).startswith("✅"):
+                    self.assertEqual(result, _baseline_product_info(name))
+                else:
+                    self.assertTrue(result.startswith("❌"))
+
+    def test_miss_suggests_close_products(self):
+        result = get_product_info("pixle 8 pro")
+        self.assertIn("Did you mean: Pixel 8 Pro", result)
+
+
+class TestLazyApp(unittest.TestCase):
+
+    def test_import_does_not_build_app(self):
+        # 独立进程中导入，避免受本进程已加载模块的影响；设置了 API Key 时也不应加载 ADK 或构建 app。
+        # cwd 设为临时目录，子进程的 logger.log 不会写进仓库
+        code = (
+            "import sys\n"
+            "from src.services import product_catalog\n"
+            "product_catalog.get_product_info('pixel')\n"
+            "print('RESULT', 'google.adk' in sys.modules, product_catalog._app is not None)\n"
+        )
+        env = dict(os.environ, GOOGLE_API_KEY="test-key", PYTHONPATH=ROOT_DIR)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = subprocess.run(
+                [sys.executable, "-c", code], cwd=tmp_dir, env=env,
+                capture_output=True, text=True, timeout=60, check=True,
+            )
+        self.assertIn("RESULT False False", result.stdout)
+
+if __name__ == "__main__":
+    unittest.main()
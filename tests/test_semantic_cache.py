@@ -0,0 +1,115 @@
+import os
+import sys
+import unittest
+from unittest import mock
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是语义缓存的可选依赖
+    np = None
+
+from memory_demo_agent import semantic_cache
+from memory_demo_agent.semantic_cache import SemanticResponseCache
+
+NAMESPACE = ("TestApp", "test_user")
+DIM = 32
+
+
+def _unit(vector):
+    return vector / np.linalg.norm(vector)
+
+
+@unittest.skipIf(np is None, "numpy not installed")
+class TestSemanticResponseCache(unittest.TestCase):
+    """
+    直接传入 embedding，不加载 sentence-transformers 模型。
+    pca_fit_size 设得很大，保持原始维度，便于与暴力检索逐一比较。
+    """
+
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+
+    def _random_vectors(self, n):
+        return [_unit(v) for v in self.rng.standard_normal((n, DIM))]
+
+    def _make_cache(self, **kwargs):
+        kwargs.setdefault("pca_fit_size", 10**6)
+        return SemanticResponseCache(**kwargs)
+
+    def test_hit_and_miss(self):
+        cache = self._make_cache()
+        stored, other = self._random_vectors(2)
+        self.assertIsNone(cache.get(NAMESPACE, "q", embedding=stored))
+
+        cache.put(NAMESPACE, "q", "answer", embedding=stored)
+        near = _unit(stored + 0.01 * self.rng.standard_normal(DIM))
+        self.assertEqual(cache.get(NAMESPACE, "q?", embedding=near), "answer")
+        self.assertIsNone(cache.get(NAMESPACE, "other", embedding=other))
+        # 不同命名空间互不可见
+        self.assertIsNone(cache.get(("OtherApp", "test_user"), "q", embedding=stored))
+
+    def test_ttl_expiry(self):
+        cache = self._make_cache(ttl_seconds=10)
+        (stored,) = self._random_vectors(1)
+        with mock.patch.object(semantic_cache.time, "monotonic", return_value=100.0):
+            cache.put(NAMESPACE, "q", "answer", embedding=stored)
+        with mock.patch.object(semantic_cache.time, "monotonic", return_value=105.0):
+            self.assertEqual(cache.get(NAMESPACE, "q", embedding=stored), "answer")
+        with mock.patch.object(semantic_cache.time, "monotonic", return_value=111.0):
+            self.assertIsNone(cache.get(NAMESPACE, "q", embedding=stored))
+
+    def test_lru_eviction(self):
+        cache = self._make_cache(max_size=3)
+        vectors = self._random_vectors(4)
+        for i, vector in enumerate(vectors[:3]):
+            cache.put(NAMESPACE, f"q{i}", f"a{i}", embedding=vector)
+        # 访问 q0 使其成为最近使用，下一次插入淘汰的是 q1
+        self.assertEqual(cache.get(NAMESPACE, "q0", embedding=vectors[0]), "a0")
+        cache.put(NAMESPACE, "q3", "a3", embedding=vectors[3])
+
+        self.assertEqual(cache.get(NAMESPACE, "q0", embedding=vectors[0]), "a0")
+        self.assertIsNone(cache.get(NAMESPACE, "q1", embedding=vectors[1]))
+        self.assertEqual(cache.get(NAMESPACE, "q2", embedding=vectors[2]), "a2")
+        self.assertEqual(cache.get(NAMESPACE, "q3", embedding=vectors[3]), "a3")
+
+    def test_default_ann_threshold_below_max_size(self):
+        cache = SemanticResponseCache(max_size=256)
+        self.assertLess(cache.ann_threshold, cache.max_size)
+
+    def test_hnsw_matches_brute_force(self):
+        try:
+            import hnswlib  # noqa: F401
+        except ImportError:
+            self.skipTest("hnswlib not installed")
+
+        brute = self._make_cache(max_size=200, ann_threshold=10**6)
+        ann = self._make_cache(max_size=200)
+        self.assertLess(ann.ann_threshold, 200)
+
+        vectors = self._random_vectors(200)
+        for i, vector in enumerate(vectors):
+            brute.put(NAMESPACE, f"q{i}", f"a{i}", embedding=vector)
+            ann.put(NAMESPACE, f"q{i}", f"a{i}", embedding=vector)
+
+        # 相近查询 (应命中) 与随机查询 (应未命中) 混合
+        queries = [_unit(v + 0.05 * self.rng.standard_normal(DIM)) for v in vectors[::4]]
+        queries += self._random_vectors(20)
+        for i, query in enumerate(queries):
+            with self.subTest(query=i):
+                self.assertEqual(
+                    ann.get(NAMESPACE, "q", embedding=query),
+                    brute.get(NAMESPACE, "q", embedding=query),
+                )
+
+        # 确认确实走了 HNSW 分支
+        self.assertEqual(len(ann._ann), 1)
+        self.assertEqual(brute._ann, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import os
+import sys
+import unittest
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from google.adk.events import Event
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from src.utils.sessions import run_batch_async
+
+
+class FakeRunner:
+    """
+    只实现 run_batch_async 用到的接口：session_service、app_name 与 run_async。
+    查询文本决定行为："fail" 抛出异常，"slow:<秒>" 先等待再回复。
+    """
+
+    def __init__(self):
+        self.app_name = "test_app"
+        self.session_service = InMemorySessionService()
+        self.active = 0
+        self.max_active = 0
+
+    async def run_async(self, user_id, session_id, new_message):
+        query = new_message.parts[0].text
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            if query.startswith("slow:"):
+                await asyncio.sleep(float(query.split(":", 1)[1]))
+            else:
+                await asyncio.sleep(0)
+            if query == "fail":
+                raise RuntimeError(f"boom in {session_id}")
+            yield Event(
+                author="fake_agent",
+                content=types.Content(role="model", parts=[types.Part(text=f"echo {query}")]),
+            )
+        finally:
+            self.active -= 1
+
+
+class TestRunBatchAsync(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.runner = FakeRunner()
+
+    async def test_results_keep_input_order(self):
+        # 前面的查询更慢、后完成，结果仍按输入顺序返回
+        queries = ["slow:0.05", "slow:0.02", "fast"]
+        results = await run_batch_async(self.runner, "u", queries, ["s0", "s1", "s2"])
+        self.assertEqual(results, [["echo slow:0.05"], ["echo slow:0.02"], ["echo fast"]])
+
+    async def test_creates_missing_sessions(self):
+        await run_batch_async(self.runner, "u", ["a", "b"], ["s0", "s1"])
+        for session_id in ("s0", "s1"):
+            session = await self.runner.session_service.get_session(
+                app_name="test_app", user_id="u", session_id=session_id
+            )
+            self.assertIsNotNone(session)
+
+    async def test_exceptions_are_returned_in_place(self):
+        results = await run_batch_async(self.runner, "u", ["a", "fail", "c"], ["s0", "s1", "s2"])
+        self.assertEqual(results[0], ["echo a"])
+        self.assertIsInstance(results[1], RuntimeError)
+        self.assertIn("s1", str(results[1]))
+        self.assertEqual(results[2], ["echo c"])
+
+    async def test_max_concurrency(self):
+        queries = ["slow:0.01"] * 6
+        session_ids = [f"s{i}" for i in range(6)]
+        await run_batch_async(self.runner, "u", queries, session_ids, max_concurrency=2)
+        self.assertEqual(self.runner.max_active, 2)
+
+    async def test_length_mismatch(self):
+        with self.assertRaises(ValueError):
+            await run_batch_async(self.runner, "u", ["a", "b"], ["s0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import logging
+import os
+import sys
+import tempfile
+import unittest
+import uuid
+from logging.handlers import QueueHandler
+
+# 添加项目根目录到 sys.path
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../"))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import settings
+
+
+class TestSetupLogging(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = settings.setup_logging("test_settings_logging")
+
+        # 把监听线程的 FileHandler 临时指向临时目录，测试记录不会写进仓库根目录的 LOG_FILE
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.file_handler = next(
+            h for h in settings._queue_listener.handlers if getattr(h, settings._FILE_SENTINEL, False)
+        )
+        self.log_file = os.path.join(self.tmp_dir.name, "test.log")
+        original = self._redirect_file_handler(self.log_file)
+        self.addCleanup(self._redirect_file_handler, original)
+
+    def _redirect_file_handler(self, path: str) -> str:
+        """Point the listener's FileHandler at `path` (reopened lazily) and return the old path."""
+        handler = self.file_handler
+        handler.acquire()
+        try:
+            if handler.stream is not None:
+                handler.stream.close()
+                handler.stream = None
+            old_path, handler.baseFilename = handler.baseFilename, os.path.abspath(path)
+        finally:
+            handler.release()
+        return old_path
+
+    def _queue_handlers(self):
+        return [h for h in logging.getLogger().handlers if isinstance(h, QueueHandler)]
+
+    def test_idempotent(self):
+        listener = settings._queue_listener
+        handlers = listener.handlers
+        queue_handlers = self._queue_handlers()
+
+        for _ in range(3):
+            settings.setup_logging("test_settings_logging")
+
+        # 重复调用不会叠加 handler，也不会重建监听线程
+        self.assertIs(settings._queue_listener, listener)
+        self.assertEqual(listener.handlers, handlers)
+        self.assertEqual(self._queue_handlers(), queue_handlers)
+        self.assertEqual(len(queue_handlers), 1)
+        self.assertTrue(settings._listener_running)
+
+    def test_fork_hooks_pause_and_resume(self):
+        self.assertTrue(settings._listener_running)
+        settings._pause_listener_before_fork()
+        try:
+            self.assertFalse(settings._listener_running)
+            self.assertTrue(settings._listener_paused)
+        finally:
+            settings._resume_listener_after_fork()
+        self.assertTrue(settings._listener_running)
+        self.assertFalse(settings._listener_paused)
+
+        # 未暂停时 resume 什么也不做
+        settings._resume_listener_after_fork()
+        self.assertTrue(settings._listener_running)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "os.fork not available")
+    def test_fork_logs_once_per_process(self):
+        parent_marker = f"parent-{uuid.uuid4().hex}"
+        child_marker = f"child-{uuid.uuid4().hex}"
+
+        # fork 前已入队的日志只在父进程中输出一次，子进程能正常输出自己的日志
+        self.logger.warning(parent_marker)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                self.logger.warning(child_marker)
+                settings._stop_listener()  # 处理完队列后再退出
+            finally:
+                os._exit(0)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertTrue(settings._listener_running)
+
+        with open(self.log_file, encoding="utf-8") as f:
+            content = f.read()
+        self.assertEqual(content.count(parent_marker), 1)
+        self.assertEqual(content.count(child_marker), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()